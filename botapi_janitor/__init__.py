@@ -6,6 +6,10 @@ from sys import stderr, stdout
 JOB_INTERVAL = int(environ.get('JANITOR_JOB_INTERVAL', str(10 * 60)))
 FILE_LIFE_TIME = int(environ.get('JANITOR_FILE_LIFE_TIME', str(5 * 60)))
 TELEGRAM_BOT_API_WORKDIR_PATH = Path(environ.get('JANITOR_WORKDIR', '/var/lib/telegram-bot-api'))
+# Files staged by the bot for the local uploads, these are normally removed right after the upload. Leftovers (e.g. the
+#   bot got restarted mid-upload) are removed once they're older than the biggest upload could possibly take
+UPLOADS_DIR_PATH = Path(environ.get('JANITOR_UPLOADS_DIR', '/var/lib/nowplaying-uploads'))
+UPLOADS_LIFE_TIME = int(environ.get('JANITOR_UPLOADS_LIFE_TIME', str(60 * 60)))
 
 
 def info(msg: str) -> None:
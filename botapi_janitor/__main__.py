@@ -1,16 +1,30 @@
 from collections.abc import Iterator
 from pathlib import Path
+from shutil import rmtree
 from time import sleep, time
 
-from . import FILE_LIFE_TIME, JOB_INTERVAL, TELEGRAM_BOT_API_WORKDIR_PATH, err, info
+from . import (
+    FILE_LIFE_TIME,
+    JOB_INTERVAL,
+    TELEGRAM_BOT_API_WORKDIR_PATH,
+    UPLOADS_DIR_PATH,
+    UPLOADS_LIFE_TIME,
+    err,
+    info,
+)
 
 
 class FileJanitor:
-    def __init__(self, workdir: Path) -> None:
+    def __init__(self, workdir: Path, uploads_dir: Path) -> None:
         self.workdir = workdir
+        self.uploads_dir = uploads_dir
         self.cleanup_dirs: tuple[str, ...] = ('music',)
 
     def clean(self) -> None:
+        # Optional, exists only when the local uploads are enabled
+        if self.uploads_dir.exists():
+            self._cleanup_uploads()
+
         if not self._verify_workdir():
             err('Workdir is not valid, skipping cleanup')
             return
@@ -19,6 +33,24 @@ class FileJanitor:
         for bot_dir in self._get_bot_directories():
             self._process_bot_directory(bot_dir)
 
+    def _cleanup_uploads(self) -> None:
+        info(f'Cleaning up {self.uploads_dir}')
+        current_time = int(time())
+
+        # Every staged file is in a directory of its own
+        for directory in self.uploads_dir.iterdir():
+            if not directory.is_dir():
+                continue
+
+            if not self._is_file_expired(directory, current_time, UPLOADS_LIFE_TIME):
+                continue
+
+            try:
+                rmtree(directory)
+                info(f'Removed outdated upload {directory.name}')
+            except OSError as e:
+                err(f'Failed to remove upload {directory.name}: {e}')
+
     def _verify_workdir(self) -> bool:
         if not self.workdir.exists():
             err(f'Workdir {self.workdir} does not exist')
@@ -45,7 +77,7 @@ class FileJanitor:
             if not file.is_file():
                 continue
 
-            if not self._is_file_expired(file, current_time):
+            if not self._is_file_expired(file, current_time, FILE_LIFE_TIME):
                 continue
 
             try:
@@ -55,14 +87,14 @@ class FileJanitor:
                 err(f'Failed to remove file {file.name}: {e}')
 
     @staticmethod
-    def _is_file_expired(file: Path, current_time: float) -> bool:
+    def _is_file_expired(file: Path, current_time: float, life_time: int) -> bool:
         try:
             mtime = file.stat().st_mtime
         except OSError as e:
             err(f'Failed to get mtime for file {file.name}: {e}')
             return False
 
-        if current_time - mtime < FILE_LIFE_TIME:
+        if current_time - mtime < life_time:
             info(f'File {file.name} is not old enough yet (age: {current_time - mtime})')
             return False
 
@@ -70,7 +102,7 @@ class FileJanitor:
 
 
 def run_janitor() -> None:
-    janitor = FileJanitor(TELEGRAM_BOT_API_WORKDIR_PATH)
+    janitor = FileJanitor(TELEGRAM_BOT_API_WORKDIR_PATH, UPLOADS_DIR_PATH)
 
     while True:
         try:
@@ -1,3 +1,6 @@
+from collections.abc import Awaitable, Callable
+from typing import Any
+
 from aiogram import Bot, Dispatcher
 from aiogram.types import (
     InlineQueryResultArticle,
@@ -21,9 +24,11 @@ from aiogram.types import (
     InlineQueryResultVenue,
     InlineQueryResultVideo,
     InlineQueryResultVoice,
+    TelegramObject,
 )
 
 from nowplaying.core.config import config
+from nowplaying.core.database import read_your_writes_scope
 
 from .session import BotSession
 
@@ -77,4 +82,17 @@ class OurBot(Bot):
 
 
 dp = Dispatcher()
+
+
+async def read_your_writes_middleware(
+    handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]], event: TelegramObject, data: dict[str, Any]
+) -> Any:  # noqa: ANN401
+    # Every update is a unit of work of its own, see `read_your_writes_scope`
+    with read_your_writes_scope():
+        return await handler(event, data)
+
+
+dp.update.outer_middleware(read_your_writes_middleware)
+
+
 bot = OurBot(token=config.BOT_TOKEN, session=BotSession())
@@ -0,0 +1,66 @@
+from asyncio import sleep
+from datetime import timedelta
+
+from nowplaying.bot.caching import verify_cached_file
+from nowplaying.core.config import config
+from nowplaying.core.database import db
+from nowplaying.core.leader import LeaderElection
+from nowplaying.util.logger import logger
+from nowplaying.util.periodic import PeriodicTask
+
+
+# 'now' 'veri', a separate election since this one has to run within a bot process
+CACHE_VERIFIER_LOCK_KEY = 0x6E6F77_76657269
+
+
+class CacheVerifier:
+    """Walks `cached_files` in batches and verifies the stale file ids, dead ones are marked for refresh."""
+
+    def __init__(self) -> None:
+        # Keyset cursor, the pass starts over once it reaches the end of the table
+        self.last_id: int = 0
+        self.verified: int = 0
+        self.dead: int = 0
+
+        self._task = PeriodicTask(
+            self.verify_batch, config.CACHED_FILES_VERIFIER_INTERVAL_SEC, name='cached_files_verifier'
+        )
+        self._leader = LeaderElection(CACHE_VERIFIER_LOCK_KEY, 'cached_files_verifier')
+        self._leader.on_change(self._on_leadership_change)
+
+    async def start(self) -> None:
+        await self._leader.start()
+
+    async def stop(self) -> None:
+        await self._leader.stop()
+
+    async def _on_leadership_change(self, *, is_leader: bool) -> None:
+        if is_leader:
+            self._task.start()
+        else:
+            await self._task.stop()
+
+    async def verify_batch(self) -> None:
+        files = await db.get_stale_cached_files(
+            self.last_id,
+            timedelta(seconds=config.CACHED_FILES_VERIFIER_STALE_AFTER_SEC),
+            config.CACHED_FILES_VERIFIER_BATCH_SIZE,
+        )
+        if not files:
+            if self.last_id:
+                logger.info(f'Cached files verification pass is done, {self.verified} verified, {self.dead} dead')
+            self.last_id = self.verified = self.dead = 0
+            return
+
+        for stale in files:
+            if await verify_cached_file(stale.uri, stale.file):
+                self.verified += 1
+            else:
+                self.dead += 1
+
+            self.last_id = stale.id
+            # Stay well below the Bot API limits, these are competing with the user requests
+            await sleep(1 / config.CACHED_FILES_VERIFIER_RATE_PER_SEC)
+
+
+cache_verifier = CacheVerifier()
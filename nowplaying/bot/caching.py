@@ -1,71 +1,217 @@
-from io import BytesIO
+from asyncio import Task, create_task, to_thread
+from collections.abc import AsyncGenerator
+from datetime import timedelta
+from pathlib import Path
+from tempfile import SpooledTemporaryFile
+from time import time
 
-from aiogram.exceptions import AiogramError, TelegramAPIError, TelegramEntityTooLarge
-from aiogram.types import BufferedInputFile, Message, User
-from aiohttp import ClientSession
+from aiogram import Bot
+from aiogram.client.telegram import PRODUCTION
+from aiogram.exceptions import AiogramError, TelegramAPIError, TelegramBadRequest, TelegramEntityTooLarge
+from aiogram.types import BufferedInputFile, InputFile, Message, User
 
 from nowplaying.bot.bot import bot
 from nowplaying.bot.reporter import report_error
+from nowplaying.bot.thumbnails import thumbnails
 from nowplaying.core.config import config
-from nowplaying.core.database import db
-from nowplaying.external.udownloader import DownloadedSong
+from nowplaying.core.database import CACHED_FILES_CHANNEL, db
+from nowplaying.core.locks import ClusterLockManager
+from nowplaying.external.udownloader import DownloadedSong, UdownloaderError, UdownloaderNetworkError, download
 from nowplaying.models.cached_file import CachedFile
 from nowplaying.models.track import Track
 from nowplaying.models.user_config import UserConfig
-from nowplaying.util.asyncio import LockManager
-from nowplaying.util.compressing import compress_to_jpeg
-from nowplaying.util.http import STATUS_OK
+from nowplaying.util.cache import LRUCache
+from nowplaying.util.logger import logger
 from nowplaying.util.retries import retry
 
 
-# key is uri
-DOWNLOADING_LOCKS = LockManager()
+# (uri, highest_available) -> cached file, repeat deliveries of the hot tracks are not touching the database at all.
+#   Invalidated via NOTIFY whenever the rows of the uri are changed by any process
+CACHED_FILES: LRUCache[tuple[str, bool], CachedFile] = LRUCache(
+    config.CACHED_FILES_L1_SIZE, ttl_sec=config.CACHED_FILES_L1_TTL_SEC
+)
+
+# file id -> unix time of its last successful verification
+VERIFIED_FILE_IDS: LRUCache[str, float] = LRUCache(config.CACHED_FILE_VERIFY_CACHE_SIZE)
+# file id -> verification in progress
+_verify_tasks: dict[str, Task] = {}
+
+# key is uri, locked across all the bot replicas and scripts ('dloa')
+DOWNLOADING_LOCKS = ClusterLockManager(namespace=0x646C6F61, channel='downloads')
 
 
 class CachingFileTooLargeError(Exception):
     """File is too large to cache."""
 
 
-async def get_cached_file_ensured(uri: str, *, highest_available: bool) -> CachedFile | None:
-    file = await db.get_cached_file(uri, highest_available=highest_available)
-    if file is None:
+TOO_LARGE_REASON = 'File is too large to cache'
+
+
+# Linux limit is 255 bytes, some room is left for the extension
+LOCAL_FILE_NAME_MAX_BYTES = 200
+
+
+def get_local_uploads_dir() -> Path | None:
+    # Only the self-hosted bot api can read from the shared volume, everything else is uploaded over HTTP
+    if config.LOCAL_TELEGRAM_API_UPLOADS_DIR is None or bot.session.api is PRODUCTION:
         return None
+    return config.LOCAL_TELEGRAM_API_UPLOADS_DIR
+
+
+def _stage_local_upload(path: Path, file_name: str, file_extension: str) -> str:
+    # NOTE(es3n1n): The bot api takes the file name from the path, so the downloaded file is renamed accordingly. It's
+    #   in a directory of its own, no need to worry about the collisions
+    file_name = file_name.replace('/', '_').encode()[:LOCAL_FILE_NAME_MAX_BYTES].decode(errors='ignore')
+    path = path.rename(path.with_name(f'{file_name}.{file_extension}'))
+    return f'file://{path}'
+
+
+class SpooledInputFile(InputFile):
+    """Streams a downloaded file into the multipart upload chunk by chunk, from the start on every (re)try."""
+
+    def __init__(self, file: SpooledTemporaryFile[bytes], filename: str) -> None:
+        super().__init__(filename=filename, chunk_size=config.UDOWNLOADER_CHUNK_SIZE)
+        self.file = file
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:  # noqa: ARG002
+        # Reads are done in a thread, the file might've been rolled over to the disk
+        self.file.seek(0)
+        while chunk := await to_thread(self.file.read, self.chunk_size):
+            yield chunk
+
+
+async def store_download_failure(uri: str, *, highest_available: bool, reason: str, too_large: bool = False) -> None:
+    # Too large files are not getting any smaller, so these are backing off for as long as possible right away
+    max_backoff = timedelta(seconds=config.DOWNLOAD_FAILURE_MAX_BACKOFF_SEC)
+    failure = await db.store_download_failure(
+        uri,
+        highest_available=highest_available,
+        reason=reason,
+        backoff=max_backoff if too_large else timedelta(seconds=config.DOWNLOAD_FAILURE_BACKOFF_SEC),
+        max_backoff=max_backoff,
+    )
+    logger.info(f'Download of {uri} failed {failure.failures} time(s), backing off until {failure.retry_after}')
+
+
+def invalidate_cached_file(uri: str) -> None:
+    for highest_available in (True, False):
+        CACHED_FILES.pop((uri, highest_available))
+
+
+def invalidate_cached_files() -> None:
+    # Invalidations of any of them might've been missed
+    CACHED_FILES.clear()
+    VERIFIED_FILE_IDS.clear()
+
+
+db.listen(CACHED_FILES_CHANNEL, invalidate_cached_file)
+db.on_listener_lost(invalidate_cached_files)
+
 
-    # Verifying that file id isn't expired
+def _is_verified(file: CachedFile) -> bool:
+    verified_at = VERIFIED_FILE_IDS.get(file.file_id)
+    if verified_at is None and file.verified_at is not None:
+        # Verified by some other process
+        verified_at = file.verified_at.timestamp()
+        VERIFIED_FILE_IDS.put(file.file_id, verified_at)
+
+    return verified_at is not None and time() - verified_at < config.CACHED_FILE_VERIFY_TTL_SEC
+
+
+async def verify_cached_file(uri: str, file: CachedFile) -> bool:
+    # `False` only if the file id is dead, transient errors are not the file's fault
     try:
         await bot.get_file(file.file_id)
-    except (AiogramError, TelegramAPIError) as err:
+    except TelegramBadRequest as err:
         if not any(x in str(err).lower() for x in ('file is too big',)):
+            # It is going to be cached again on the next request
+            logger.warning(f'Cached file {uri} failed the verification, marking for refresh: {err}')
+            VERIFIED_FILE_IDS.pop(file.file_id)
+            invalidate_cached_file(uri)
+            await db.mark_cached_file_for_refresh(uri, file.file_id)
+            return False
+    except (AiogramError, TelegramAPIError) as err:
+        # Might be temporary, we will try again later
+        logger.warning(f'Unable to verify cached file {uri}: {err}')
+        return True
+
+    VERIFIED_FILE_IDS.put(file.file_id, time())
+    await db.mark_cached_file_verified(uri, file.file_id)
+    return True
+
+
+def _schedule_verification(uri: str, file: CachedFile) -> None:
+    if file.file_id in _verify_tasks:
+        return
+
+    task = create_task(verify_cached_file(uri, file))
+    _verify_tasks[file.file_id] = task
+    task.add_done_callback(lambda _: _verify_tasks.pop(file.file_id, None))
+
+
+async def get_cached_file_ensured(uri: str, *, highest_available: bool) -> CachedFile | None:
+    file = CACHED_FILES.get((uri, highest_available))
+    if file is None:
+        file = await db.get_cached_file(uri, highest_available=highest_available)
+        if file is None:
             return None
+        CACHED_FILES.put((uri, highest_available), file)
+
+    # NOTE(es3n1n): Verifying that the file id isn't expired is a Bot API roundtrip, so it's done only once in a while
+    #   and without blocking the response. Files that fail it are marked for refresh and are not returned anymore
+    if not _is_verified(file):
+        _schedule_verification(uri, file)
     return file
 
 
+async def get_verified_cached_files(uris: list[str], *, highest_available: bool) -> dict[str, CachedFile]:
+    # Files that weren't verified recently are left out, a single dead file id would fail the whole inline answer
+    files: dict[str, CachedFile] = {}
+    missing: list[str] = []
+    for uri in uris:
+        file = CACHED_FILES.get((uri, highest_available))
+        if file is None:
+            missing.append(uri)
+        else:
+            files[uri] = file
+
+    for uri, file in (await db.get_cached_files(missing, highest_available=highest_available)).items():
+        CACHED_FILES.put((uri, highest_available), file)
+        files[uri] = file
+
+    verified: dict[str, CachedFile] = {}
+    for uri, file in files.items():
+        if _is_verified(file):
+            verified[uri] = file
+        else:
+            _schedule_verification(uri, file)
+    return verified
+
+
+async def claim_prefetched_file(uri: str, file: CachedFile, user: User, user_config: UserConfig) -> None:
+    # Prefetched files have no owner until someone actually chooses them, see `Prefetcher`
+    if file.cached_by_user_id is not None or user_config.stats_opt_out:
+        return
+
+    await db.claim_cached_file(uri, file.file_id, user.id)
+    invalidate_cached_file(uri)
+
+
 async def process_thumbnail_jpeg(thumbnail_url: str | None) -> BufferedInputFile | None:
-    thumbnail: BufferedInputFile | None = None
     if not thumbnail_url:
-        return thumbnail
-
-    async with ClientSession() as session, session.get(thumbnail_url) as resp:
-        if resp.status != STATUS_OK:
-            # :shrug:
-            return None
+        return None
 
-        try:
-            data = await resp.read()
-        except TimeoutError:
-            return None
+    data = await thumbnails.get(thumbnail_url)
+    if data is None:
+        return None
 
-        return BufferedInputFile(
-            # Compress JPEG to avoid hitting the 200 kb limit
-            file=compress_to_jpeg(BytesIO(data), target_size_kb=200).getvalue(),
-            filename='thumbnail.jpeg',
-        )
+    return BufferedInputFile(file=data, filename='thumbnail.jpeg')
 
 
 async def cache_file(
     track: Track,
     file: DownloadedSong,
-    user: User,
+    user: User | None,
     user_config: UserConfig | None,
 ) -> CachedFile:
     # If (for example) we are downloading the best quality,
@@ -75,22 +221,25 @@ async def cache_file(
     if file_same_quality:
         # Promote to our quality
         await db.mark_cached_file_quality(track.uri, marked_as_highest_available=file.quality['highest_available'])
+        invalidate_cached_file(track.uri)
         return file_same_quality
 
     # Special handling for UUIDs
     uri_safe = track.uri.replace('-', '_')
 
-    stats_user_id: int | None = user.id
-    stats_user_username: str | None = user.username
-    stats_user_name: str | None = user.full_name
+    stats_user_id: int | None = None
+    stats_user_username: str | None = None
+    stats_user_name: str | None = None
 
-    # Set user id to None if user has opted out from stats
-    if not user_config:
-        user_config = await db.get_user_config(user.id)
-    if user_config.stats_opt_out:
-        stats_user_id = None
-        stats_user_username = None
-        stats_user_name = None
+    # Files that were cached on nobody's behalf (prefetched) have no owner,
+    #   neither do the ones of the users that have opted out from stats
+    if user is not None:
+        if not user_config:
+            user_config = await db.get_user_config(user.id)
+        if not user_config.stats_opt_out:
+            stats_user_id = user.id
+            stats_user_username = user.username
+            stats_user_name = user.full_name
 
     # These two are important
     caption = f'#{uri_safe}'
@@ -113,14 +262,21 @@ async def cache_file(
     #   .vorbis files will be sent as .ogg with `audio/vorbis` mime_type instead of `audio/ogg`.
     # No, this is not a behavior specific to bot api, even if you set the voice_note
     #   within file attrs to False, it will still be sent as a voice message through raw MTProto.
-    file_name += f'.{file.file_extension if file.file_extension != "ogg" else "vorbis"}'
+    file_extension = file.file_extension if file.file_extension != 'ogg' else 'vorbis'
+
+    # Staged files are read by the bot api right from the shared volume, no need to send them over HTTP
+    audio: InputFile | str
+    if isinstance(file.data, Path):
+        audio = _stage_local_upload(file.data, file_name, file_extension)
+    else:
+        audio = SpooledInputFile(file.data, filename=f'{file_name}.{file_extension}')
 
     sent: Message | None = None
     async for _ in retry(3):
         try:
             sent = await bot.send_audio(
                 config.BOT_CACHE_CHAT_ID,
-                BufferedInputFile(file=file.data, filename=file_name),
+                audio,
                 caption=caption,
                 performer=track.artist,
                 title=track.name,
@@ -142,4 +298,47 @@ async def cache_file(
         raise ValueError(msg)
 
     await db.store_cached_file(track.uri, sent.audio.file_id, stats_user_id, file.quality)
-    return CachedFile(file_id=sent.audio.file_id, cached_by_user_id=user.id, quality_info=file.quality)
+    VERIFIED_FILE_IDS.put(sent.audio.file_id, time())
+
+    # Same owner as in the database, opted out users are not remembered anywhere
+    cached_file = CachedFile(file_id=sent.audio.file_id, cached_by_user_id=stats_user_id, quality_info=file.quality)
+    CACHED_FILES.put((track.uri, file.quality['highest_available']), cached_file)
+    return cached_file
+
+
+async def download_and_cache_file(track: Track, user: User | None, user_config: UserConfig) -> CachedFile:
+    # Failures are remembered (see `store_download_failure`) and reported, the caller only has to let the user know
+    song_link = await track.song_link()
+    try:
+        downloaded = await download(
+            song_link,  # type: ignore[arg-type]
+            download_flac=user_config.download_flac,
+            fast_route=user_config.fast_download_route,
+            staging_dir=get_local_uploads_dir(),
+        )
+    except UdownloaderError as err:
+        # Network errors are not the track's fault
+        if not isinstance(err, UdownloaderNetworkError):
+            await store_download_failure(track.uri, highest_available=user_config.download_flac, reason=str(err))
+        await report_error(f'Unable to download {track.model_dump_json()} {song_link=}', exception=err)
+        raise
+
+    try:
+        cached_file = await cache_file(track=track, file=downloaded, user=user, user_config=user_config)
+    except CachingFileTooLargeError:
+        await store_download_failure(
+            track.uri, highest_available=user_config.download_flac, reason=TOO_LARGE_REASON, too_large=True
+        )
+        await report_error(f'Unable to download {track.model_dump_json()}\nError = file is too large to cache')
+        raise
+    finally:
+        # Removes the downloaded file from the disk, if it got there
+        downloaded.close()
+
+    await db.delete_download_failures(track.uri)
+    return cached_file
+
+
+async def log_cache_stats() -> None:
+    logger.info(f'Cached files cache: {CACHED_FILES.stats}')
+    logger.info(f'Verified file ids cache: {VERIFIED_FILE_IDS.stats}')
@@ -12,7 +12,8 @@ async def handle_loading_button(query: CallbackQuery) -> None:
         msg = 'Query data is None'
         raise ValueError(msg)
 
-    config = await db.get_user_config(query.from_user.id)
+    context = await db.get_user_context(query.from_user.id)
+    config = context.user_config
     query_args = extract_from_query(query.data, arguments_count=2)
     if len(query_args) != 2:  # noqa: PLR2004
         await bot.answer_callback_query(
@@ -27,12 +28,18 @@ async def handle_loading_button(query: CallbackQuery) -> None:
         return
 
     _, track_uri = query_args
-    if DOWNLOADING_LOCKS.is_locked(track_uri):
+    if await DOWNLOADING_LOCKS.is_locked(track_uri):
         await bot.answer_callback_query(query.id, text=config.text('Already downloading the audio, please wait'))
         return
 
+    if await db.get_download_failure(track_uri, highest_available=config.download_flac):
+        await bot.answer_callback_query(
+            query.id, text=config.text('This track has failed to download recently, please try again later')
+        )
+        return
+
     try:
-        await update_placeholder_message_audio(query.from_user, track_uri, query.inline_message_id)
+        await update_placeholder_message_audio(query.from_user, track_uri, query.inline_message_id, context)
         await bot.answer_callback_query(query.id, text=config.text('Downloading started'))
     except ValueError:
         await bot.answer_callback_query(
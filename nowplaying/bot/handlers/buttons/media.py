@@ -34,15 +34,16 @@ async def handle_media_buttons(query: CallbackQuery) -> None:
         msg = 'Unsupported query data'
         raise ValueError(msg)
 
-    config = await db.get_user_config(query.from_user.id)
+    context = await db.get_user_context(query.from_user.id)
+    config = context.user_config
     command, platform_name, track_id = extract_from_query(query.data, arguments_count=3)
     platform_type = SongLinkPlatformType(platform_name)
 
-    if not await db.is_user_authorized(query.from_user.id, platform_type):
+    if not context.is_authorized(platform_type):
         await bot.answer_callback_query(query.id, config.text('Please authorize first'))
         return
 
-    client = await get_platform_from_telegram_id(query.from_user.id, platform_type)
+    client = await get_platform_from_telegram_id(query.from_user.id, platform_type, context)
 
     if not is_feature_supported(client, command):
         await bot.answer_callback_query(query.id, config.text('Unsupported command'))
@@ -7,11 +7,6 @@ from nowplaying.core.database import db
 from nowplaying.util.string import extract_from_query
 
 
-async def on_changed(user_id: int, field: str, *, new_value: bool) -> None:
-    if field == 'stats_opt_out' and new_value:
-        await db.strip_user_id_from_cached_files(user_id)
-
-
 async def handle_toggle_button(query: CallbackQuery) -> None:
     if query.data is None or query.message is None:
         raise ValueError
@@ -23,10 +18,13 @@ async def handle_toggle_button(query: CallbackQuery) -> None:
         raise ValueError(err_msg)
 
     new_value = not getattr(config, var_name)
-    setattr(config, var_name, new_value)
 
+    # NOTE(es3n1n): Cached files of the users that have opted out from the stats are stripped in the background,
+    #   see `nowplaying.core.jobs.strip_opted_out_users`
     await db.update_config_var(query.from_user.id, var_name, new_value=new_value)
-    await on_changed(query.from_user.id, var_name, new_value=new_value)
+
+    # Cached configs are shared with every other handler, so they are never modified in place
+    config = config.model_copy(update={var_name: new_value})
 
     await bot.answer_callback_query(query.id, text=config.text(f'Toggled to {new_value}'))
 
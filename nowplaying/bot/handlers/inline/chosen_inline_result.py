@@ -4,20 +4,31 @@ from aiogram.types import ChosenInlineResult, User
 from nowplaying.bot.bot import bot, dp
 from nowplaying.bot.caching import (
     DOWNLOADING_LOCKS,
+    TOO_LARGE_REASON,
     CachingFileTooLargeError,
-    cache_file,
+    claim_prefetched_file,
+    download_and_cache_file,
     get_cached_file_ensured,
 )
+from nowplaying.bot.prefetch import prefetcher
 from nowplaying.bot.reporter import report_error
 from nowplaying.core.database import db
-from nowplaying.external.udownloader import UdownloaderError, download
+from nowplaying.core.stats import sent_tracks_stats
+from nowplaying.external.udownloader import UdownloaderError
 from nowplaying.models.cached_file import CachedFile
 from nowplaying.models.track import Track
 from nowplaying.models.user_config import UserConfig
+from nowplaying.models.user_context import UserContext
 from nowplaying.util.logger import logger
+from nowplaying.util.string import QUERY_SEPARATOR
 
 from .inline import parse_track_from_uri
-from .inline_utils import UNAVAILABLE_MSG_DETAILED, track_to_caption, update_inline_message_audio
+from .inline_utils import (
+    CACHED_RESULT_ID_PREFIX,
+    UNAVAILABLE_MSG_DETAILED,
+    track_to_caption,
+    update_inline_message_audio,
+)
 
 
 async def _unavailable(caption: str, error: str, inline_message_id: str, user_config: UserConfig) -> None:
@@ -29,54 +40,78 @@ async def _unavailable(caption: str, error: str, inline_message_id: str, user_co
     )
 
 
-async def _get_cached_file(
-    inline_message_id: str, from_user: User, track: Track, caption: str, user_config: UserConfig
-) -> CachedFile | None:
-    # Increment sent tracks statistics
-    if not user_config.stats_opt_out:
-        await db.increment_sent_tracks_count(from_user.id)
+async def _lookup_cached_file(
+    inline_message_id: str, from_user: User, track: Track, caption: str, user_config: UserConfig, *, prefetched: bool
+) -> tuple[bool, CachedFile | None]:
+    # Whether there's nothing to download, along with the file (`None` if it's unavailable)
 
     # Cached file, no need to download
     cached_file = await get_cached_file_ensured(track.uri, highest_available=user_config.download_flac)
     if cached_file:
-        return cached_file
+        if prefetched:
+            await claim_prefetched_file(track.uri, cached_file, from_user, user_config)
+        return True, cached_file
 
-    # Cache missed, downloading
-    song_link = await track.song_link()
-    try:
-        downloaded = await download(
-            song_link,  # type: ignore[arg-type]
-            download_flac=user_config.download_flac,
-            fast_route=user_config.fast_download_route,
-        )
-    except UdownloaderError as err:
-        await _unavailable(caption, str(err), inline_message_id, user_config)
-        await report_error(f'Unable to download {track.model_dump_json()} {song_link=}', exception=err)
-        return None
+    # Failed recently, no need to waste udownloader on it again
+    failure = await db.get_download_failure(track.uri, highest_available=user_config.download_flac)
+    if failure:
+        await _unavailable(caption, failure.reason, inline_message_id, user_config)
+        return True, None
 
-    try:
-        return await cache_file(
-            track=track,
-            file=downloaded,
-            user=from_user,
-            user_config=user_config,
-        )
-    except CachingFileTooLargeError:
-        # TODO(es3n1n): we should remember that this file is too large and not try to cache it again
-        await _unavailable(caption, 'File is too large to cache', inline_message_id, user_config)
-        await report_error(f'Unable to download {track.model_dump_json()}\nError = file is too large to cache')
-        return None
+    return False, None
 
 
 async def get_cached_file(
-    inline_message_id: str, from_user: User, track: Track, caption: str, user_config: UserConfig
+    inline_message_id: str,
+    from_user: User,
+    track: Track,
+    caption: str,
+    user_config: UserConfig,
+    *,
+    prefetched: bool = False,
 ) -> CachedFile | None:
+    # Increment sent tracks statistics, these are flushed to the database in the background
+    if not user_config.stats_opt_out:
+        sent_tracks_stats.increment(from_user.id)
+
+    # NOTE(es3n1n): The cluster lock is only there so that the same track isn't downloaded twice, cache hits (and the
+    #   recent failures) are served without it
+    done, cached_file = await _lookup_cached_file(
+        inline_message_id, from_user, track, caption, user_config, prefetched=prefetched
+    )
+    if done:
+        return cached_file
+
     async with DOWNLOADING_LOCKS.lock(track.uri):
-        return await _get_cached_file(inline_message_id, from_user, track, caption, user_config)
+        # Someone might've downloaded it (or failed to) while we were waiting for the lock
+        done, cached_file = await _lookup_cached_file(
+            inline_message_id, from_user, track, caption, user_config, prefetched=prefetched
+        )
+        if done:
+            return cached_file
+
+        # Cache missed, downloading
+        try:
+            return await download_and_cache_file(track, from_user, user_config)
+        except UdownloaderError as err:
+            await _unavailable(caption, str(err), inline_message_id, user_config)
+        except CachingFileTooLargeError:
+            await _unavailable(caption, TOO_LARGE_REASON, inline_message_id, user_config)
+        return None
+
 
+async def update_placeholder_message_audio(
+    from_user: User,
+    uri: str,
+    inline_message_id: str,
+    context: UserContext | None = None,
+    *,
+    prefetched: bool = False,
+) -> None:
+    if context is None:
+        context = await db.get_user_context(from_user.id)
 
-async def update_placeholder_message_audio(from_user: User, uri: str, inline_message_id: str) -> None:
-    client, track = await parse_track_from_uri(from_user.id, uri)
+    client, track = await parse_track_from_uri(from_user.id, uri, context)
     if track is None or client is None or not await track.song_link():
         # :shrug:, there's nothing we can do
         logger.error(from_user.model_dump())
@@ -85,13 +120,13 @@ async def update_placeholder_message_audio(from_user: User, uri: str, inline_mes
         await report_error('Something unusual happened, track or client or song link is None')
         return
 
-    user_config = await db.get_user_config(from_user.id)
+    user_config = context.user_config
     caption = await track_to_caption(user_config, client, track, quality=None, is_getter_available=True)
     logger.info(
         f'Processing {track.artist} - {track.name} ({track.platform.name})',
     )
 
-    file = await get_cached_file(inline_message_id, from_user, track, caption, user_config)
+    file = await get_cached_file(inline_message_id, from_user, track, caption, user_config, prefetched=prefetched)
     if not file:
         return
 
@@ -107,8 +142,21 @@ async def update_placeholder_message_audio(from_user: User, uri: str, inline_mes
 @dp.chosen_inline_result()
 async def chosen_inline_result_handler(inline_result: ChosenInlineResult) -> None:
     if inline_result.inline_message_id is None:
+        # Cached results were sent as is, there's nothing to edit, only the statistics are left to account for
+        prefix, _, uri = inline_result.result_id.partition(QUERY_SEPARATOR)
+        if prefix == CACHED_RESULT_ID_PREFIX:
+            prefetched = prefetcher.on_chosen(inline_result.from_user.id, uri)
+            user_config = await db.get_user_config(inline_result.from_user.id)
+            if not user_config.stats_opt_out:
+                sent_tracks_stats.increment(inline_result.from_user.id)
+
+            if prefetched and (
+                cached_file := await get_cached_file_ensured(uri, highest_available=user_config.download_flac)
+            ):
+                await claim_prefetched_file(uri, cached_file, inline_result.from_user, user_config)
         return
 
+    prefetched = prefetcher.on_chosen(inline_result.from_user.id, inline_result.result_id)
     await update_placeholder_message_audio(
-        inline_result.from_user, inline_result.result_id, inline_result.inline_message_id
+        inline_result.from_user, inline_result.result_id, inline_result.inline_message_id, prefetched=prefetched
     )
@@ -5,37 +5,46 @@ from aiogram import types
 from aiogram.enums import ParseMode
 
 from nowplaying.bot.bot import bot, dp
+from nowplaying.bot.caching import get_verified_cached_files
+from nowplaying.bot.prefetch import prefetcher
 from nowplaying.core.config import config
 from nowplaying.core.database import db
 from nowplaying.enums.callback_buttons import CallbackButton
 from nowplaying.enums.platform_features import PlatformFeature
+from nowplaying.models.cached_file import CachedFile
 from nowplaying.models.song_link import SongLinkPlatformType
 from nowplaying.models.track import Track
 from nowplaying.models.user_config import UserConfig
+from nowplaying.models.user_context import UserContext
 from nowplaying.platforms import PlatformClientABC, get_platform_from_telegram_id, get_platform_track
 from nowplaying.util.string import encode_query, extract_from_query
 
-from .inline_utils import NUM_OF_ITEMS_TO_QUERY, track_to_caption
+from .inline_utils import CACHED_RESULT_ID_PREFIX, NUM_OF_ITEMS_TO_QUERY, track_to_caption
 
 
-async def parse_track_from_uri(user_id: int, uri: str) -> tuple[PlatformClientABC | None, Track | None]:
+async def parse_track_from_uri(
+    user_id: int, uri: str, context: UserContext | None = None
+) -> tuple[PlatformClientABC | None, Track | None]:
     platform_name, track_id = extract_from_query(uri, arguments_count=2)
     platform_type = SongLinkPlatformType(platform_name)
 
-    if not await db.is_user_authorized(user_id, platform_type):
+    if context is None:
+        context = await db.get_user_context(user_id)
+
+    if not context.is_authorized(platform_type):
         msg = f'User is not authorized {user_id=}'
         raise ValueError(msg)
 
-    return await get_platform_track(track_id, user_id, platform_type)
+    return await get_platform_track(track_id, user_id, platform_type, context)
 
 
 async def _fetch_feed(
     clients: dict[SongLinkPlatformType, PlatformClientABC],
     feed: list[Track],
-    user_id: int,
+    context: UserContext,
     platform_type: SongLinkPlatformType,
 ) -> None:
-    client = await get_platform_from_telegram_id(user_id, platform_type)
+    client = await get_platform_from_telegram_id(context.telegram_id, platform_type, context)
 
     feed.extend([track async for track in client.get_current_and_recent_tracks(NUM_OF_ITEMS_TO_QUERY)])
     clients[platform_type] = client
@@ -43,19 +52,16 @@ async def _fetch_feed(
 
 async def fetch_feed_and_clients(
     query_id: str,
-    user_id: int,
-    user_config: UserConfig,
+    context: UserContext,
 ) -> tuple[list[Track] | None, dict[SongLinkPlatformType, PlatformClientABC] | None]:
     feed: list[Track] = []
     clients: dict[SongLinkPlatformType, PlatformClientABC] = {}
 
-    authorized_platforms = await db.get_user_authorized_platforms(user_id)
-
-    if not authorized_platforms:
+    if not context.is_authorized_globally:
         await bot.answer_inline_query(
             inline_query_id=query_id,
             button=types.InlineQueryResultsButton(
-                text=user_config.text('Authorize'),
+                text=context.user_config.text('Authorize'),
                 # We don't really care about start parameter, but it can't be an empty string
                 start_parameter='hello',
             ),
@@ -64,8 +70,8 @@ async def fetch_feed_and_clients(
         return None, None
 
     async with TaskGroup() as group:
-        for platform in authorized_platforms:
-            group.create_task(_fetch_feed(clients, feed, user_id, platform))
+        for platform in context.authorized_platforms:
+            group.create_task(_fetch_feed(clients, feed, context, platform))
 
     return feed, clients
 
@@ -74,17 +80,34 @@ async def feed_to_inline_results(
     feed: list[Track],
     clients: dict[SongLinkPlatformType, PlatformClientABC],
     user_config: UserConfig,
-) -> list[types.InlineQueryResultArticle | types.InlineQueryResultAudio]:
+) -> list[types.InlineQueryResultArticle | types.InlineQueryResultAudio | types.InlineQueryResultCachedAudio]:
     seen_uris: set[str] = set()
     sorted_feed = sort_feed(feed)
 
+    # Already cached tracks are sent right away, no need to go through the placeholders for them
+    cached_files = await get_verified_cached_files(
+        [track.uri for track in prefetchable_tracks(feed, clients)], highest_available=user_config.download_flac
+    )
+
     return [
-        await create_result_item(track, clients, user_config, seen_uris, index)
+        await create_result_item(track, clients, user_config, seen_uris, index, cached_files.get(track.uri))
         for index, track in enumerate(sorted_feed)
         if track.uri not in seen_uris
     ]
 
 
+def prefetchable_tracks(feed: list[Track], clients: dict[SongLinkPlatformType, PlatformClientABC]) -> list[Track]:
+    # Same order as the results, only the ones that could be downloaded
+    tracks: dict[str, Track] = {}
+    for track in sort_feed(feed):
+        if track.uri in tracks or not track.is_available:
+            continue
+        if not clients[track.platform].features.get(PlatformFeature.TRACK_GETTERS, True):
+            continue
+        tracks[track.uri] = track
+    return list(tracks.values())
+
+
 def sort_feed(feed: list[Track]) -> list[Track]:
     return sorted(
         feed,
@@ -99,10 +122,21 @@ async def create_result_item(
     user_config: UserConfig,
     seen_uris: set,
     index: int,
-) -> types.InlineQueryResultAudio:
+    cached_file: CachedFile | None = None,
+) -> types.InlineQueryResultAudio | types.InlineQueryResultCachedAudio:
     seen_uris.add(track.uri)
     client = clients[track.platform]
 
+    if cached_file is not None:
+        # NOTE(es3n1n): There's no inline keyboard, so there won't be any `inline_message_id` to edit when it's chosen.
+        #   The id is prefixed to tell these apart from the placeholders, see `chosen_inline_result_handler`
+        return types.InlineQueryResultCachedAudio(
+            id=encode_query(CACHED_RESULT_ID_PREFIX, track.uri),
+            audio_file_id=cached_file.file_id,
+            caption=await track_to_caption(user_config, client, track, cached_file.quality_info),
+            parse_mode=ParseMode.HTML,
+        )
+
     is_getter_available = client.features.get(PlatformFeature.TRACK_GETTERS, True)
     is_track_available = track.is_available
     can_proceed = is_getter_available and is_track_available
@@ -151,8 +185,9 @@ async def create_result_item(
 
 @dp.inline_query()
 async def inline_query_handler(query: types.InlineQuery) -> None:
-    user_config = await db.get_user_config(query.from_user.id)
-    feed, clients = await fetch_feed_and_clients(query.id, query.from_user.id, user_config)
+    context = await db.get_user_context(query.from_user.id)
+    user_config = context.user_config
+    feed, clients = await fetch_feed_and_clients(query.id, context)
     if feed is None or clients is None:
         return
 
@@ -169,3 +204,5 @@ async def inline_query_handler(query: types.InlineQuery) -> None:
         )
 
     await bot.answer_inline_query(query.id, results=result_items)  # type: ignore[arg-type]
+    # The first result is chosen most of the time, so it might as well be downloading while the user is choosing
+    prefetcher.schedule(query.from_user, user_config, prefetchable_tracks(feed, clients))
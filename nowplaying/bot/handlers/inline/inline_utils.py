@@ -17,6 +17,8 @@ from nowplaying.util.retries import retry
 NUM_OF_ITEMS_TO_QUERY: int = 2
 UNAVAILABLE_MSG: str = 'Error: this track is not available :('
 UNAVAILABLE_MSG_DETAILED: str = 'Unavailable: {error}'
+# Inline results that were sent with the cached file right away have ids like `c_<uri>`
+CACHED_RESULT_ID_PREFIX: str = 'c'
 
 
 async def track_to_caption(
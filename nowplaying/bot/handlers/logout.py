@@ -12,13 +12,14 @@ async def link_command_handler(message: Message) -> None:
     if message.from_user is None:
         raise ValueError
 
-    user_config = await db.get_user_config(message.from_user.id)
+    context = await db.get_user_context(message.from_user.id)
+    user_config = context.user_config
     kb = [
         InlineKeyboardButton(
             text=user_config.text(f'Logout from {platform.value.capitalize()}'),
             callback_data=encode_query(CallbackButton.LOGOUT_PREFIX, platform.value),
         )
-        for platform in await db.get_user_authorized_platforms(message.from_user.id)
+        for platform in context.authorized_platforms
     ]
 
     if not kb:
@@ -6,11 +6,13 @@ from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
 from nowplaying.bot.bot import bot, dp
 from nowplaying.core.config import config
 from nowplaying.core.database import db
+from nowplaying.core.stats import sent_tracks_stats
 from nowplaying.enums.callback_buttons import CallbackButton
 from nowplaying.enums.platform_features import PlatformFeature
 from nowplaying.enums.start_actions import StartAction
 from nowplaying.models.song_link import SongLinkPlatformType
 from nowplaying.models.user_config import UserConfig
+from nowplaying.models.user_context import UserContext
 from nowplaying.platforms import get_platform_from_telegram_id, soundcloud, yandex
 from nowplaying.util.string import QUERY_SEPARATOR, encode_query, extract_from_query
 
@@ -46,17 +48,18 @@ async def send_auth_msg(telegram_id: int, platform_type: SongLinkPlatformType) -
     )
 
 
-async def _handle_controls(uri: str, message: Message, user_config: UserConfig) -> bool:
+async def _handle_controls(uri: str, message: Message, context: UserContext) -> bool:
     if message.from_user is None:
         raise ValueError
 
+    user_config = context.user_config
     platform_name, track_id = extract_from_query(uri, arguments_count=2)
     platform_type = SongLinkPlatformType(platform_name)
 
-    if not await db.is_user_authorized(message.from_user.id, platform_type):
+    if not context.is_authorized(platform_type):
         return False
 
-    client = await get_platform_from_telegram_id(message.from_user.id, platform_type)
+    client = await get_platform_from_telegram_id(message.from_user.id, platform_type, context)
     track = await client.get_track(track_id)
 
     if not track:
@@ -112,7 +115,7 @@ async def _handle_controls(uri: str, message: Message, user_config: UserConfig)
     return True
 
 
-async def _try_controls(payload: str, message: Message, user_config: UserConfig) -> bool:
+async def _try_controls(payload: str, message: Message, context: UserContext) -> bool:
     uri = config.decode_start_url(payload)
     if not uri:
         return False
@@ -120,13 +123,15 @@ async def _try_controls(payload: str, message: Message, user_config: UserConfig)
     if QUERY_SEPARATOR not in uri:
         return False
 
-    return await _handle_controls(uri, message, user_config)
+    return await _handle_controls(uri, message, context)
 
 
-async def _try_start_cmds(message: Message, *, authorized: bool, user_config: UserConfig) -> bool:
+async def _try_start_cmds(message: Message, *, context: UserContext) -> bool:
     if message.text is None or message.from_user is None:
         return False
 
+    user_config = context.user_config
+
     if message.text.find(' ') == -1:
         return False
 
@@ -150,11 +155,11 @@ async def _try_start_cmds(message: Message, *, authorized: bool, user_config: Us
                 )
             ),
             parse_mode=ParseMode.HTML,
-            reply_markup=await get_auth_keyboard(message.from_user.id, user_config),
+            reply_markup=await get_auth_keyboard(context),
         )
         return True
 
-    return authorized and await _try_controls(payload, message, user_config)
+    return context.is_authorized_globally and await _try_controls(payload, message, context)
 
 
 async def _start_message_authorized(user_config: UserConfig) -> str:
@@ -189,9 +194,10 @@ async def command_start_handler(message: Message) -> None:
     if message.from_user is None or message.text is None:
         return
 
-    user_config = await db.get_user_config(message.from_user.id)
-    authorized: bool = await db.is_user_authorized_globally(message.from_user.id)
-    if await _try_start_cmds(message, authorized=authorized, user_config=user_config):
+    context = await db.get_user_context(message.from_user.id)
+    user_config = context.user_config
+    authorized: bool = context.is_authorized_globally
+    if await _try_start_cmds(message, context=context):
         return
 
     sections = []
@@ -201,7 +207,9 @@ async def command_start_handler(message: Message) -> None:
         sections.append(_start_message_unauthorized())
 
     cached_tracks_count = await db.get_cached_files_count_for_user(message.from_user.id)
+    # Account for the increments that weren't flushed yet
     tracks_sent = await db.get_user_sent_tracks_count(message.from_user.id)
+    tracks_sent += sent_tracks_stats.pending(message.from_user.id)
     if authorized and (cached_tracks_count or tracks_sent):
         sections.append(
             'Your activity:'
@@ -217,7 +225,7 @@ async def command_start_handler(message: Message) -> None:
 
     await message.reply(
         text=user_config.text('\n\n'.join(sections)),
-        reply_markup=await get_auth_keyboard(message.from_user.id, user_config),
+        reply_markup=await get_auth_keyboard(context),
         parse_mode=ParseMode.HTML,
         disable_web_page_preview=True,
     )
@@ -0,0 +1,157 @@
+from asyncio import CancelledError, Task, create_task, current_task, gather
+from functools import partial
+from typing import cast
+
+from aiogram.types import User
+
+from nowplaying.bot.caching import (
+    DOWNLOADING_LOCKS,
+    CachingFileTooLargeError,
+    download_and_cache_file,
+    get_cached_file_ensured,
+)
+from nowplaying.core.config import config
+from nowplaying.core.database import db
+from nowplaying.external.udownloader import UdownloaderError
+from nowplaying.models.track import Track
+from nowplaying.models.user_config import UserConfig
+from nowplaying.util.cache import LRUCache
+from nowplaying.util.logger import logger
+
+
+# Up to N started downloads are remembered, choices of the older ones are not counted as hits
+STARTED_CACHE_SIZE = 10_000
+
+
+class Prefetcher:
+    """Speculatively downloads the top inline results before the user has chosen any of them."""
+
+    def __init__(self) -> None:
+        # user id -> uri -> download that the user might still choose, superseded by their next inline query
+        self._pending: dict[int, dict[str, Task[None]]] = {}
+        # Every running download, including the ones that were chosen already
+        self._running: set[Task[None]] = set()
+        # Downloads that got past the checks and are holding the downloading lock
+        self._downloading: set[Task[None]] = set()
+        # (user id, uri) of the downloads that were started, so that the choice could be attributed to them
+        self._started: LRUCache[tuple[int, str], None] = LRUCache(STARTED_CACHE_SIZE)
+
+        self.started: int = 0
+        self.hits: int = 0
+        self.cancelled: int = 0
+        self.over_budget: int = 0
+
+    @property
+    def enabled(self) -> bool:
+        return config.PREFETCH_TOP_N > 0 and config.PREFETCH_MAX_CONCURRENT > 0
+
+    @property
+    def stats(self) -> str:
+        hit_rate = self.hits / self.started if self.started else 0.0
+        return (
+            f'{self.started} started, {self.hits} chosen ({hit_rate:.1%}), '
+            f'{self.cancelled} cancelled, {self.over_budget} over budget'
+        )
+
+    async def stop(self) -> None:
+        logger.info(f'Prefetched downloads: {self.stats}')
+        for task in self._running:
+            task.cancel()
+        await gather(*self._running, return_exceptions=True)
+
+    def schedule(self, user: User, user_config: UserConfig, tracks: list[Track]) -> None:
+        if not self.enabled:
+            return
+
+        tracks = tracks[: config.PREFETCH_TOP_N]
+        uris = {track.uri for track in tracks}
+
+        # The user has moved on, whatever wasn't on top this time is unlikely to be chosen
+        pending = self._pending.setdefault(user.id, {})
+        for uri in [x for x in pending if x not in uris]:
+            task = pending.pop(uri)
+
+            # NOTE(es3n1n): Downloads that are already in flight are left to finish, cancelling them would throw away
+            #   the progress and force whoever is waiting on the lock (the user might've chosen it after all) to
+            #   download it all over again
+            if task in self._downloading:
+                continue
+
+            task.cancel()
+            self.cancelled += 1
+
+        for track in tracks:
+            if track.uri in pending:
+                continue
+
+            # NOTE(es3n1n): Speculative downloads are the first thing to go when we're busy, the real ones are not
+            #   limited by this budget at all
+            if len(self._running) >= config.PREFETCH_MAX_CONCURRENT:
+                self.over_budget += 1
+                break
+
+            task = create_task(self._prefetch(track, user.id, user_config))
+            pending[track.uri] = task
+            self._running.add(task)
+            task.add_done_callback(partial(self._on_done, user_id=user.id, uri=track.uri))
+
+        if not pending:
+            self._pending.pop(user.id, None)
+
+    def on_chosen(self, user_id: int, uri: str) -> bool:
+        # Returns whether the chosen track was prefetched for this user, so that it could be attributed to them
+        if not self.enabled:
+            return False
+
+        # Chosen downloads are not cancellable anymore, the chosen result handler is waiting for them on the lock
+        pending = self._pending.get(user_id, {})
+        pending.pop(uri, None)
+        if not pending:
+            self._pending.pop(user_id, None)
+
+        if (user_id, uri) not in self._started:
+            return False
+
+        self._started.pop((user_id, uri))
+        self.hits += 1
+        return True
+
+    def _on_done(self, task: Task[None], user_id: int, uri: str) -> None:
+        self._running.discard(task)
+        self._downloading.discard(task)
+
+        pending = self._pending.get(user_id, {})
+        if pending.get(uri) is task:
+            pending.pop(uri)
+        if not pending:
+            self._pending.pop(user_id, None)
+
+    async def _prefetch(self, track: Track, user_id: int, user_config: UserConfig) -> None:
+        # Someone is downloading it already
+        if await DOWNLOADING_LOCKS.is_locked(track.uri):
+            return
+
+        async with DOWNLOADING_LOCKS.lock(track.uri):
+            if await get_cached_file_ensured(track.uri, highest_available=user_config.download_flac):
+                return
+            if await db.get_download_failure(track.uri, highest_available=user_config.download_flac):
+                return
+            if not await track.song_link():
+                return
+
+            self.started += 1
+            self._started.put((user_id, track.uri), None)
+            self._downloading.add(cast('Task[None]', current_task()))
+            logger.info(f'Prefetching {track.artist} - {track.name} ({track.platform.name})')
+            try:
+                # Nobody has chosen it yet, the owner is set once someone does (see `claim_prefetched_file`)
+                await download_and_cache_file(track, None, user_config)
+            except (UdownloaderError, CachingFileTooLargeError):
+                # Already remembered and reported, the user will see the error once they choose it
+                pass
+            except CancelledError:
+                logger.info(f'Prefetching of {track.uri} got cancelled')
+                raise
+
+
+prefetcher = Prefetcher()
@@ -0,0 +1,143 @@
+from asyncio import Task, get_running_loop, shield
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from io import BytesIO
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+from aiohttp import ClientError, ClientSession, ClientTimeout
+
+from nowplaying.core.config import config
+from nowplaying.util.cache import LRUCache
+from nowplaying.util.compressing import compress_to_jpeg
+from nowplaying.util.http import STATUS_OK
+from nowplaying.util.logger import logger
+from nowplaying.util.periodic import PeriodicTask
+
+
+# Telegram has a 200 kb limit for the song covers
+THUMBNAIL_MAX_SIZE_KB = 200
+
+
+def _compress(data: bytes) -> bytes:
+    return compress_to_jpeg(
+        BytesIO(data), target_size_kb=THUMBNAIL_MAX_SIZE_KB, max_edge=config.THUMBNAIL_MAX_EDGE
+    ).getvalue()
+
+
+def _mtime(path: Path) -> float:
+    # Might be pruned by another process in the meantime
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+class ThumbnailService:
+    """Downloads and compresses the song covers, results are cached in memory and on disk by the cover url."""
+
+    def __init__(self, cache_dir: Path) -> None:
+        self.cache_dir = cache_dir
+        self.memory: LRUCache[str, bytes] = LRUCache(config.THUMBNAIL_MEMORY_CACHE_SIZE)
+
+        self._session: ClientSession | None = None
+        # NOTE(es3n1n): PIL releases the GIL while decoding/encoding, so threads are enough to keep a huge png cover
+        #   from blocking the event loop
+        self._executor = ThreadPoolExecutor(max_workers=config.THUMBNAIL_WORKERS, thread_name_prefix='thumbnails')
+        # Tracks from the same album are often requested at the same time, no need to process the same cover twice
+        self._pending: dict[str, Task[bytes | None]] = {}
+        self._prune_task = PeriodicTask(self._prune, config.THUMBNAIL_DISK_CACHE_PRUNE_INTERVAL_SEC, name='thumbnails')
+
+    async def start(self) -> None:
+        self._prune_task.start()
+
+    async def stop(self) -> None:
+        logger.info(f'Thumbnails cache: {self.memory.stats}')
+        await self._prune_task.stop()
+        if self._session is not None:
+            session, self._session = self._session, None
+            await session.close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def get(self, url: str) -> bytes | None:
+        data = self.memory.get(url)
+        if data is not None:
+            return data
+
+        task = self._pending.get(url)
+        if task is None:
+            task = get_running_loop().create_task(self._load(url))
+            self._pending[url] = task
+            task.add_done_callback(lambda _: self._pending.pop(url, None))
+        # Shared between the callers, one of them being cancelled shouldn't cancel the rest
+        return await shield(task)
+
+    async def _load(self, url: str) -> bytes | None:
+        loop = get_running_loop()
+        path = self.cache_dir / f'{sha256(url.encode()).hexdigest()}.jpeg'
+
+        data = await loop.run_in_executor(self._executor, self._read_cached, path)
+        if data is None:
+            raw = await self._download(url)
+            if raw is None:
+                return None
+
+            # Thumbnails are optional, a broken cover shouldn't fail the upload
+            try:
+                data = await loop.run_in_executor(self._executor, _compress, raw)
+            except OSError as err:
+                logger.warning(f'Unable to compress thumbnail {url}: {err}')
+                return None
+
+            try:
+                await loop.run_in_executor(self._executor, self._write_cached, path, data)
+            except OSError as err:
+                logger.warning(f'Unable to cache thumbnail {url} on disk: {err}')
+
+        self.memory.put(url, data)
+        return data
+
+    async def _download(self, url: str) -> bytes | None:
+        if self._session is None:
+            self._session = ClientSession(timeout=ClientTimeout(total=config.THUMBNAIL_DOWNLOAD_TIMEOUT_SEC))
+
+        try:
+            async with self._session.get(url) as resp:
+                if resp.status != STATUS_OK:
+                    # :shrug:
+                    return None
+                return await resp.read()
+        except (ClientError, TimeoutError) as err:
+            logger.warning(f'Unable to download thumbnail {url}: {err}')
+            return None
+
+    @staticmethod
+    def _read_cached(path: Path) -> bytes | None:
+        try:
+            data = path.read_bytes()
+            # Bump mtime, the least recently used ones are pruned first
+            path.touch()
+        except OSError:
+            return None
+        return data
+
+    def _write_cached(self, path: Path, data: bytes) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Written to a temporary file first, so that other processes never read a partially written thumbnail
+        with NamedTemporaryFile(dir=self.cache_dir, suffix='.tmp', delete=False) as tmp:
+            tmp.write(data)
+        Path(tmp.name).replace(path)
+
+    async def _prune(self) -> None:
+        await get_running_loop().run_in_executor(self._executor, self._prune_cached)
+
+    def _prune_cached(self) -> None:
+        if not self.cache_dir.exists():
+            return
+
+        files = sorted(self.cache_dir.glob('*.jpeg'), key=_mtime, reverse=True)
+        for path in files[config.THUMBNAIL_DISK_CACHE_MAX_FILES :]:
+            path.unlink(missing_ok=True)
+
+
+thumbnails = ThumbnailService(config.THUMBNAIL_CACHE_DIR)
@@ -1,75 +1,400 @@
+from asyncio import Task, get_running_loop, sleep
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator, Sequence
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+from typing import Any, TypeVar, cast
+
 import orjson
-from asyncpg import Pool, create_pool
+from asyncpg import Connection, Pool, Record, connect, create_pool
+from asyncpg.exceptions import InterfaceError, PostgresError
+from asyncpg.pool import PoolConnectionProxy
 
 from nowplaying.core.config import config
-from nowplaying.core.database_init import DATABASE_INIT_SQL
+from nowplaying.core.db_metrics import DatabaseMetrics
+from nowplaying.core.migrations import migrate
+from nowplaying.core.queries import Query
 from nowplaying.external.udownloader import SongQualityInfo
-from nowplaying.models.cached_file import CachedFile
-from nowplaying.models.cached_local_track import CachedLocalTrack
-from nowplaying.models.song_link import SongLinkPlatformType
+from nowplaying.models.cached_file import CachedFile, CachedFileRow, StaleCachedFile
+from nowplaying.models.cached_local_track import CachedLocalTrack, LocalTrackRow
+from nowplaying.models.download_failure import DownloadFailure
+from nowplaying.models.song_link import CachedSongLink, SongLinkPlatformType
 from nowplaying.models.user_config import UserConfig
+from nowplaying.models.user_context import UserContext
+from nowplaying.util.cache import LRUCache
 from nowplaying.util.dns import select_hostname
 from nowplaying.util.logger import logger
-from nowplaying.util.worker import worker
+from nowplaying.util.periodic import PeriodicTask
+
+
+# NOTIFY channel, payload is the user id whose config has changed
+USER_CONFIGS_CHANNEL = 'user_configs'
+# NOTIFY channel, payload is the uri whose cached files have changed
+CACHED_FILES_CHANNEL = 'cached_files'
+LISTENER_RECONNECT_DELAY_SEC = 5
+
+# last_used_at of the local tracks is bumped at most once per this interval, no need to write on every lookup
+LOCAL_TRACK_TOUCH_INTERVAL = timedelta(days=1)
+
+# Anything that could go wrong with the replica itself, reads are retried on the primary
+REPLICA_ERRORS = (OSError, TimeoutError, InterfaceError, PostgresError)
+
+# Set once the current unit of work (an update, a periodic job iteration) has written something, the replica might not
+#   have these writes yet, so all the following reads within it are going to the primary
+_read_your_writes: ContextVar[bool] = ContextVar('read_your_writes', default=False)
+
+T = TypeVar('T')
+
+
+@contextmanager
+def read_your_writes_scope() -> Iterator[None]:
+    # NOTE(es3n1n): The flag has to be scoped, otherwise a long-lived task that wrote once would stick to the primary
+    #   forever. Tasks created within the scope are getting a copy of the flag, as usual with the context vars
+    token = _read_your_writes.set(False)
+    try:
+        yield
+    finally:
+        _read_your_writes.reset(token)
+
+
+# Binary jsonb is the json text prefixed by a format version byte
+JSONB_BINARY_VERSION = b'\x01'
+
+
+def _encode_jsonb(value: object) -> bytes:
+    return JSONB_BINARY_VERSION + orjson.dumps(value)
+
+
+def _decode_jsonb(data: bytes) -> Any:  # noqa: ANN401
+    return orjson.loads(data[1:])
+
+
+def to_numeric(value: float) -> Decimal:
+    # NOTE(es3n1n): asyncpg binds floats to NUMERIC via `Decimal(float)`, so 44.1 would be sent as 44.1000000000000014..
+    #   and never match the 44.1 that postgres has parsed from the JSON. Going through the shortest repr avoids that
+    return Decimal(str(value))
+
+
+db_metrics = DatabaseMetrics()
+
+
+class DatabaseConnection(Connection):
+    """Pooled connection that runs the registered queries and collects their latencies."""
+
+    async def fetch_query(self, query: Query, *args: Any) -> list[Record]:  # noqa: ANN401
+        with db_metrics.measure_query(query.name):
+            return await self.fetch(query.value, *args)
+
+    async def fetchrow_query(self, query: Query, *args: Any) -> Record | None:  # noqa: ANN401
+        with db_metrics.measure_query(query.name):
+            return await self.fetchrow(query.value, *args)
+
+    async def fetchval_query(self, query: Query, *args: Any) -> Any:  # noqa: ANN401
+        with db_metrics.measure_query(query.name):
+            return await self.fetchval(query.value, *args)
+
+    async def execute_query(self, query: Query, *args: Any) -> str:  # noqa: ANN401
+        with db_metrics.measure_query(query.name):
+            return await self.execute(query.value, *args)
 
 
 class Database:
     def __init__(self) -> None:
         self._pool: Pool | None = None
+        self._replica_pool: Pool | None = None
+        # None until the first check, so that the initial state gets logged too
+        self._replica_available: bool | None = None
+        self._replica_task = PeriodicTask(
+            self._check_replica, config.POSTGRES_REPLICA_CHECK_INTERVAL_SEC, name='database_replica_check'
+        )
+        self._metrics_task = PeriodicTask(
+            self._report_metrics, config.POSTGRES_METRICS_LOG_INTERVAL_SEC, name='database_metrics'
+        )
+
+        # A dedicated connection for LISTEN, pooled connections are getting `UNLISTEN *` on release
+        self._listener: Connection | None = None
+        self._listeners: dict[str, list[Callable[[str], None]]] = {}
+        self._reconnect_task: Task | None = None
+        # Channels that were added after the listener has started, see `listen`
+        self._listen_tasks: set[Task[None]] = set()
+        # Called whenever notifications might've been missed, see `on_listener_lost`
+        self._listener_lost_callbacks: list[Callable[[], None]] = []
+
+        self.user_configs: LRUCache[int, UserConfig] = LRUCache(config.USER_CONFIG_CACHE_SIZE)
+        # Bumped on every invalidation, so that we won't cache a config that was read before the NOTIFY arrived
+        self._user_configs_epoch: int = 0
+        self.listen(USER_CONFIGS_CHANNEL, self._on_user_config_changed)
+        self.on_listener_lost(self._invalidate_user_configs)
 
     async def init(self) -> None:
         await self.get_pool()
 
+    async def close(self) -> None:
+        logger.info(f'User configs cache: {self.user_configs.stats}')
+        await self._metrics_task.stop()
+        await self._replica_task.stop()
+        await self._report_metrics()
+
+        if self._listener is not None:
+            listener, self._listener = self._listener, None
+            await listener.close()
+
+        if self._replica_pool is not None:
+            replica_pool, self._replica_pool = self._replica_pool, None
+            self._replica_available = None
+            await replica_pool.close()
+
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await pool.close()
+
+    @staticmethod
+    async def _init_connection(conn: Connection) -> None:
+        # Let orjson handle all the json (de)serialization, so that we could pass/receive python objects directly.
+        # Binary format is required for COPY
+        await conn.set_type_codec(
+            'json', schema='pg_catalog', encoder=orjson.dumps, decoder=orjson.loads, format='binary'
+        )
+        await conn.set_type_codec(
+            'jsonb', schema='pg_catalog', encoder=_encode_jsonb, decoder=_decode_jsonb, format='binary'
+        )
+
+    @staticmethod
+    def _connect_kwargs() -> dict[str, Any]:
+        return {
+            'host': select_hostname(config.POSTGRES_DOCKER_ADDRESS, config.POSTGRES_ADDRESS, config.POSTGRES_PORT),
+            'port': config.POSTGRES_PORT,
+            'user': config.POSTGRES_USER,
+            'password': config.POSTGRES_PASSWORD,
+            'database': config.POSTGRES_DB,
+        }
+
+    def _pool_kwargs(self) -> dict[str, Any]:
+        return {
+            'min_size': config.POSTGRES_POOL_MIN_SIZE,
+            'max_size': config.POSTGRES_POOL_MAX_SIZE,
+            'max_inactive_connection_lifetime': config.POSTGRES_MAX_INACTIVE_CONNECTION_LIFETIME_SEC,
+            'command_timeout': config.POSTGRES_COMMAND_TIMEOUT_SEC,
+            # Registered queries are always fitting in the cache, so they are prepared only once per connection
+            'statement_cache_size': len(Query) + config.POSTGRES_STATEMENT_CACHE_SIZE,
+            'connection_class': DatabaseConnection,
+            'init': self._init_connection,
+        }
+
     async def get_pool(self) -> Pool:
         if self._pool is None:
             logger.info('Connecting to the database')
 
-            self._pool = await create_pool(
-                host=select_hostname(config.POSTGRES_DOCKER_ADDRESS, config.POSTGRES_ADDRESS, config.POSTGRES_PORT),
-                port=config.POSTGRES_PORT,
-                user=config.POSTGRES_USER,
-                password=config.POSTGRES_PASSWORD,
-                database=config.POSTGRES_DB,
-            )
+            self._pool = await create_pool(**self._connect_kwargs(), **self._pool_kwargs())
 
             if self._pool is None:
                 msg = 'pool is none'
                 raise ValueError(msg)
 
-            if not worker.is_first:
-                return self._pool
+            # Every process is running this, migrations are serialized by an advisory lock
+            async with self._pool.acquire() as conn:
+                await migrate(conn)
 
-            logger.info('Initializing the database')
-            async with self._pool.acquire() as conn, conn.transaction():
-                await conn.execute(DATABASE_INIT_SQL)
+            await self._start_listener()
+            if config.POSTGRES_METRICS_LOG_INTERVAL_SEC > 0:
+                self._metrics_task.start()
+
+            if config.POSTGRES_REPLICA_DSN:
+                await self._check_replica()
+                self._replica_task.start()
 
         return self._pool
 
+    async def _check_replica(self) -> None:
+        try:
+            if self._replica_pool is None:
+                self._replica_pool = await create_pool(config.POSTGRES_REPLICA_DSN, **self._pool_kwargs())
+            async with self._acquire(self._replica_pool) as conn:
+                lag_sec = await conn.fetchval_query(Query.GET_REPLICA_LAG)
+        except REPLICA_ERRORS as err:
+            self._set_replica_available(available=False, reason=f'unreachable ({err})')
+            return
+
+        self._set_replica_available(
+            available=lag_sec <= config.POSTGRES_REPLICA_MAX_LAG_SEC,
+            reason=f'lagging behind by {lag_sec:.1f}s',
+        )
+
+    def _set_replica_available(self, *, available: bool, reason: str) -> None:
+        if available == self._replica_available:
+            return
+
+        self._replica_available = available
+        if available:
+            logger.info('Database replica is available, routing reads to it')
+        else:
+            logger.warning(f'Database replica is {reason}, routing reads to the primary')
+
+    @asynccontextmanager
+    async def _acquire(self, pool: Pool | None = None) -> AsyncIterator[DatabaseConnection]:
+        if pool is None:
+            pool = await self.get_pool()
+
+        with db_metrics.measure(db_metrics.acquire):
+            conn = await pool.acquire(timeout=config.POSTGRES_POOL_ACQUIRE_TIMEOUT_SEC)
+        try:
+            with db_metrics.track_in_use():
+                # Pool hands out proxies, they are forwarding everything to our connection class
+                yield cast('DatabaseConnection', conn)
+        finally:
+            await pool.release(conn)
+
+    @asynccontextmanager
+    async def _acquire_for_write(self) -> AsyncIterator[DatabaseConnection]:
+        _read_your_writes.set(True)
+        async with self._acquire() as conn:
+            yield conn
+
+    async def _read(
+        self, callback: Callable[[DatabaseConnection], Awaitable[T]], *, miss_on_primary: bool = False
+    ) -> T:
+        # Replica whenever possible, primary otherwise. With `miss_on_primary`, empty results from the replica are
+        #   double-checked on the primary, for lookups where a false miss is expensive (e.g. the row was written by
+        #   another process moments ago)
+        if self._replica_pool is not None and self._replica_available and not _read_your_writes.get():
+            try:
+                async with self._acquire(self._replica_pool) as conn:
+                    result = await callback(conn)
+            except REPLICA_ERRORS as err:
+                self._set_replica_available(available=False, reason=f'unreachable ({err})')
+            else:
+                if result is not None or not miss_on_primary:
+                    return result
+
+        async with self._acquire() as conn:
+            return await callback(conn)
+
+    async def _report_metrics(self) -> None:
+        if self._pool is None:
+            return
+
+        for line in db_metrics.report(self._pool.get_size(), self._pool.get_max_size()):
+            logger.info(f'Database {line}')
+        if self._replica_pool is not None:
+            state = 'available' if self._replica_available else 'unavailable'
+            logger.info(f'Database replica: {self._replica_pool.get_size()} connections, {state}')
+        db_metrics.reset()
+
+    def listen(self, channel: str, callback: Callable[[str], None]) -> None:
+        """Subscribe to a NOTIFY channel, callback receives the payload."""
+        callbacks = self._listeners.setdefault(channel, [])
+        callbacks.append(callback)
+
+        # NOTE(es3n1n): The listener connection LISTENs only to the channels that were known when it was started, so
+        #   the late ones are added on the fly. Whatever is sent to them before that's done is missed
+        if len(callbacks) == 1 and self._listener is not None:
+            task = get_running_loop().create_task(self._add_listener(self._listener, channel))
+            self._listen_tasks.add(task)
+            task.add_done_callback(self._listen_tasks.discard)
+
+    async def _add_listener(self, listener: Connection, channel: str) -> None:
+        try:
+            await listener.add_listener(channel, self._dispatch_notification)
+        except (OSError, InterfaceError, PostgresError) as err:
+            # The connection is gone, the reconnected one is going to LISTEN to every channel anyway
+            logger.opt(exception=err).warning(f'Unable to listen to {channel}')
+
+    def on_listener_lost(self, callback: Callable[[], None]) -> None:
+        """Subscribe to the listener connection losses, everything that's invalidated via NOTIFY should be dropped."""
+        self._listener_lost_callbacks.append(callback)
+
+    def _dispatch_notification(self, _: Any, __: int, channel: str, payload: object) -> None:  # noqa: ANN401
+        for callback in self._listeners.get(channel, []):
+            callback(str(payload))
+
+    async def connect(self) -> Connection:
+        # Dedicated connection outside of the pool, for the session-level stuff like LISTEN or advisory locks
+        return await connect(**self._connect_kwargs())
+
+    async def create_session_pool(self, max_size: int) -> Pool:
+        # Same as `connect`, but for the session-level stuff that's done by a bunch of tasks at once
+        return await create_pool(
+            **self._connect_kwargs(),
+            min_size=0,
+            max_size=max_size,
+            max_inactive_connection_lifetime=config.POSTGRES_MAX_INACTIVE_CONNECTION_LIFETIME_SEC,
+        )
+
+    async def _start_listener(self) -> None:
+        # NOTE(es3n1n): The listener is published only once it's listening to every channel, a half-initialized one
+        #   would've been mistaken for a working one. Channels that are added while we're at it are picked up too
+        listener = await self.connect()
+        try:
+            registered: set[str] = set()
+            while channels := [x for x in self._listeners if x not in registered]:
+                for channel in channels:
+                    await listener.add_listener(channel, self._dispatch_notification)
+                    registered.add(channel)
+        except BaseException:
+            listener.terminate()
+            raise
+
+        self._listener = listener
+        self._listener.add_termination_listener(self._on_listener_terminated)
+
+    def _notify_listener_lost(self) -> None:
+        for callback in self._listener_lost_callbacks:
+            callback()
+
+    def _on_listener_terminated(self, _: Connection | PoolConnectionProxy) -> None:
+        # We might have missed some notifications, so nothing that we've cached could be trusted anymore
+        self._notify_listener_lost()
+        if self._listener is None:
+            # Closed by us
+            return
+
+        self._listener = None
+        logger.warning('Database listener connection is lost, reconnecting')
+        self._reconnect_task = get_running_loop().create_task(self._reconnect_listener())
+
+    async def _reconnect_listener(self) -> None:
+        while self._pool is not None and self._listener is None:
+            try:
+                await self._start_listener()
+            except (OSError, InterfaceError, PostgresError) as err:
+                logger.opt(exception=err).warning('Unable to reconnect the database listener')
+                await sleep(LISTENER_RECONNECT_DELAY_SEC)
+                continue
+
+            # Whatever got cached while we weren't listening could've been invalidated in the meantime too
+            self._notify_listener_lost()
+
+    def _invalidate_user_configs(self, user_id: int | None = None) -> None:
+        self._user_configs_epoch += 1
+        if user_id is None:
+            self.user_configs.clear()
+            return
+        self.user_configs.pop(user_id)
+
+    def _on_user_config_changed(self, payload: str) -> None:
+        self._invalidate_user_configs(int(payload))
+
+    async def is_advisory_lock_held(self, namespace: int, lock_id: int) -> bool:
+        async with self._acquire() as conn:
+            return await conn.fetchval_query(Query.IS_ADVISORY_LOCK_HELD, namespace, lock_id)
+
     async def is_user_authorized_globally(self, telegram_id: int) -> bool:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn:
-            auth_result = await conn.fetch('SELECT 1 FROM tokens WHERE telegram_id = $1 LIMIT 1', telegram_id)
-            return bool(auth_result)
+        auth_result = await self._read(lambda conn: conn.fetch_query(Query.IS_USER_AUTHORIZED_GLOBALLY, telegram_id))
+        return bool(auth_result)
 
     async def is_user_authorized(self, telegram_id: int, platform: SongLinkPlatformType) -> bool:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn:
-            auth_result = await conn.fetch(
-                'SELECT 1 FROM tokens WHERE telegram_id = $1 AND platform_name = $2 LIMIT 1',
-                telegram_id,
-                platform.value,
-            )
-            return bool(auth_result)
+        auth_result = await self._read(
+            lambda conn: conn.fetch_query(Query.IS_USER_AUTHORIZED, telegram_id, platform.value)
+        )
+        return bool(auth_result)
 
     async def get_user_authorized_platforms(self, telegram_id: int) -> list[SongLinkPlatformType]:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn:
-            platforms = await conn.fetch('SELECT (platform_name) FROM tokens WHERE telegram_id = $1', telegram_id)
-            return [SongLinkPlatformType(row['platform_name']) for row in platforms]
+        platforms = await self._read(lambda conn: conn.fetch_query(Query.GET_USER_AUTHORIZED_PLATFORMS, telegram_id))
+        return [SongLinkPlatformType(row['platform_name']) for row in platforms]
 
     async def delete_user_token(self, telegram_id: int, platform: SongLinkPlatformType) -> bool:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn:
+        async with self._acquire_for_write() as conn:
             async with conn.transaction():
                 delete_stat = await conn.fetch(
                     'DELETE FROM tokens WHERE telegram_id = $1 AND platform_name = $2 RETURNING *',
@@ -79,130 +404,213 @@ class Database:
             return bool(delete_stat)
 
     async def store_user_token(self, telegram_id: int, platform: SongLinkPlatformType, token: str) -> None:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn, conn.transaction():
-            await conn.execute(
-                'INSERT INTO tokens (telegram_id, platform_name, token) VALUES ($1, $2, $3) '
-                'ON CONFLICT (telegram_id, platform_name) DO UPDATE SET token = $3',
-                telegram_id,
-                platform.value,
-                token,
-            )
+        async with self._acquire_for_write() as conn, conn.transaction():
+            await conn.fetch_query(Query.STORE_USER_TOKEN, telegram_id, platform.value, token)
 
     async def get_user_token(self, telegram_id: int, platform: SongLinkPlatformType) -> str | None:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn:
-            user_token = await conn.fetchrow(
-                'SELECT (token) FROM tokens WHERE telegram_id = $1 AND platform_name = $2 LIMIT 1',
-                telegram_id,
-                platform.value,
-            )
-            return None if user_token is None else user_token['token']
+        user_token = await self._read(
+            lambda conn: conn.fetchrow_query(Query.GET_USER_TOKEN, telegram_id, platform.value),
+            miss_on_primary=True,
+        )
+        return None if user_token is None else user_token['token']
 
     async def store_cached_file(
         self, uri: str, file_id: str, cached_by_user_id: int | None, quality_info: SongQualityInfo
     ) -> None:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn, conn.transaction():
+        async with self._acquire_for_write() as conn, conn.transaction():
+            await conn.fetch_query(Query.STORE_CACHED_FILE, uri, file_id, cached_by_user_id, quality_info)
+
+    async def claim_cached_file(self, uri: str, file_id: str, user_id: int) -> None:
+        async with self._acquire_for_write() as conn:
+            await conn.execute_query(Query.CLAIM_CACHED_FILE, uri, file_id, user_id)
+
+    async def bulk_store_cached_files(self, files: Sequence[CachedFileRow]) -> None:
+        # COPY into a staging table and merge it in one statement, way faster than an upsert per row.
+        # Staging tables are per connection and emptied on commit, so they are created once per pooled connection
+        if not files:
+            return
+
+        async with self._acquire_for_write() as conn, conn.transaction():
+            await conn.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS cached_files_staging ('
+                'id BIGINT GENERATED ALWAYS AS IDENTITY, '
+                'uri VARCHAR NOT NULL, '
+                'file_id VARCHAR NOT NULL, '
+                'cached_by_user_id BIGINT, '
+                'quality_info JSONB NOT NULL'
+                ') ON COMMIT DELETE ROWS'
+            )
+            await conn.copy_records_to_table('cached_files_staging', records=files, columns=CachedFileRow._fields)
+            # NOTE(es3n1n): Files without the quality info (e.g. the legacy captions) are getting a NULL in the
+            #   `highest_available` column, and NULLs never conflict with anything. So the ones that are being replaced
+            #   are deleted explicitly, otherwise every batch (and every rebuild) would pile up another copy of them
+            await conn.execute(
+                'DELETE FROM cached_files USING cached_files_staging '
+                'WHERE cached_files.uri = cached_files_staging.uri '
+                'AND cached_files.highest_available IS NULL '
+                "AND cached_files_staging.quality_info ->> 'highest_available' IS NULL"
+            )
             await conn.execute(
                 'INSERT INTO cached_files (uri, file_id, cached_by_user_id, quality_info) '
-                'VALUES ($1, $2, $3, $4) '
+                # Same uri and quality (NULL included) might appear multiple times within a batch,
+                #   the last copied one wins. Staging ids are assigned in the COPY order, so this is deterministic
+                "SELECT DISTINCT ON (uri, (quality_info ->> 'highest_available')::BOOLEAN) "
+                'uri, file_id, cached_by_user_id, quality_info '
+                'FROM cached_files_staging '
+                "ORDER BY uri, (quality_info ->> 'highest_available')::BOOLEAN, id DESC "
                 'ON CONFLICT (uri, highest_available) DO UPDATE '
                 'SET '
                 'file_id = EXCLUDED.file_id, '
                 'cached_by_user_id = EXCLUDED.cached_by_user_id, '
-                'quality_info = EXCLUDED.quality_info;',
-                uri,
-                file_id,
-                cached_by_user_id,
-                orjson.dumps(quality_info).decode(),
+                'quality_info = EXCLUDED.quality_info, '
+                # Not verified yet, but not known to be dead either
+                'verified_at = NULL, '
+                'needs_refresh = FALSE;'
             )
 
     async def get_cached_file(self, uri: str, *, highest_available: bool) -> CachedFile | None:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn:
-            cached_file = await conn.fetchrow(
-                'SELECT * FROM cached_files WHERE uri = $1 AND (quality_info @> $2 OR quality_info @> $3) LIMIT 1',
-                uri,
-                f'{{"highest_available":{'true' if highest_available else 'false'}}}',  # direct quality match
-                '{"marked_as_highest_available":true}',  # same file for both qualities
-            )
-            if not cached_file:
-                return None
-            return CachedFile.model_validate(dict(cached_file))
+        cached_file = await self._read(
+            lambda conn: conn.fetchrow_query(Query.GET_CACHED_FILE, uri, highest_available),
+            miss_on_primary=True,
+        )
+        if not cached_file:
+            return None
+        return CachedFile.from_record(cached_file)
 
-    async def get_cached_file_by_quality(self, uri: str, file_quality: SongQualityInfo) -> CachedFile | None:
-        file_quality_copy = dict(file_quality).copy()
-        file_quality_copy.pop('highest_available')
+    async def get_cached_files(self, uris: list[str], *, highest_available: bool) -> dict[str, CachedFile]:
+        if not uris:
+            return {}
 
-        pool = await self.get_pool()
-        async with pool.acquire() as conn:
-            cached_file = await conn.fetchrow(
-                'SELECT * FROM cached_files WHERE uri = $1 AND quality_info @> $2 LIMIT 1',
+        records = await self._read(lambda conn: conn.fetch_query(Query.GET_CACHED_FILES, uris, highest_available))
+        return {record['uri']: CachedFile.from_record(record) for record in records}
+
+    async def get_cached_file_by_quality(self, uri: str, file_quality: SongQualityInfo) -> CachedFile | None:
+        cached_file = await self._read(
+            lambda conn: conn.fetchrow_query(
+                Query.GET_CACHED_FILE_BY_QUALITY,
                 uri,
-                orjson.dumps(file_quality_copy).decode(),
-            )
-            if not cached_file:
-                return None
-            return CachedFile.model_validate(dict(cached_file))
+                file_quality['bit_depth'],
+                to_numeric(file_quality['bitrate_kbps']),
+                to_numeric(file_quality['sample_rate_khz']),
+            ),
+            miss_on_primary=True,
+        )
+        if not cached_file:
+            return None
+        return CachedFile.from_record(cached_file)
 
     async def mark_cached_file_quality(self, uri: str, *, marked_as_highest_available: bool) -> None:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn, conn.transaction():
+        async with self._acquire_for_write() as conn, conn.transaction():
             await conn.execute(
-                'UPDATE cached_files SET quality_info = quality_info || $1 WHERE uri = $2',
-                # NOTE(es3n1n): i don't feel like getting overhead from json dumps here
-                '{"marked_as_highest_available":true}'
-                if marked_as_highest_available
-                else '{"marked_as_highest_available":false}',
+                'UPDATE cached_files '
+                "SET quality_info = quality_info || jsonb_build_object('marked_as_highest_available', $1::BOOLEAN) "
+                'WHERE uri = $2',
+                marked_as_highest_available,
                 uri,
             )
+            await conn.execute_query(Query.NOTIFY_CACHED_FILES_CHANGED, [uri])
+
+    async def get_stale_cached_files(self, after_id: int, ttl: timedelta, limit: int) -> list[StaleCachedFile]:
+        # Served from the replica, a few seconds of lag doesn't matter for a background sweep
+        rows = await self._read(lambda conn: conn.fetch_query(Query.GET_STALE_CACHED_FILES, after_id, ttl, limit))
+        return [StaleCachedFile(row['id'], row['uri'], CachedFile.from_record(row)) for row in rows]
+
+    async def mark_cached_file_verified(self, uri: str, file_id: str) -> None:
+        async with self._acquire_for_write() as conn:
+            await conn.execute_query(Query.MARK_CACHED_FILE_VERIFIED, uri, file_id)
+
+    async def mark_cached_file_for_refresh(self, uri: str, file_id: str) -> None:
+        async with self._acquire_for_write() as conn, conn.transaction():
+            await conn.execute_query(Query.MARK_CACHED_FILE_FOR_REFRESH, uri, file_id)
+            await conn.execute_query(Query.NOTIFY_CACHED_FILES_CHANGED, [uri])
 
     async def delete_cached_files(self, uris: list[str]) -> None:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn, conn.transaction():
+        async with self._acquire_for_write() as conn, conn.transaction():
             await conn.execute('DELETE FROM cached_files WHERE uri = ANY($1)', uris)
-
-    async def store_song_link(self, song_url: str, song_link: str) -> None:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn, conn.transaction():
-            await conn.execute(
-                'INSERT INTO cached_song_link_urls (song_url, song_link) VALUES ($1, $2) '
-                'ON CONFLICT (song_url) DO UPDATE SET song_link = $2',
-                song_url,
-                song_link,
+            await conn.execute_query(Query.NOTIFY_CACHED_FILES_CHANGED, uris)
+
+    async def store_download_failure(
+        self, uri: str, *, highest_available: bool, reason: str, backoff: timedelta, max_backoff: timedelta
+    ) -> DownloadFailure:
+        async with self._acquire_for_write() as conn:
+            # Upsert always returns exactly one row
+            (row,) = await conn.fetch_query(
+                Query.STORE_DOWNLOAD_FAILURE, uri, highest_available, reason, backoff, max_backoff
             )
+        return DownloadFailure(row['reason'], row['failures'], row['retry_after'])
 
-    async def get_song_link(self, song_url: str) -> str | None:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn:
-            song_link = await conn.fetchrow(
-                'SELECT (song_link) FROM cached_song_link_urls WHERE song_url = $1 LIMIT 1', song_url
-            )
-            return None if song_link is None else song_link['song_link']
-
-    async def cache_local_track(self, platform: SongLinkPlatformType, url: str, artist: str, name: str) -> str:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn:
-            cache_result = await conn.fetchval(
-                'SELECT cache_local_track_id($1, $2, $3, $4)',
-                platform.value,
-                url,
-                artist,
-                name,
-            )
-            return str(cache_result[0])
+    async def get_download_failure(self, uri: str, *, highest_available: bool) -> DownloadFailure | None:
+        row = await self._read(lambda conn: conn.fetchrow_query(Query.GET_DOWNLOAD_FAILURE, uri, highest_available))
+        if row is None:
+            return None
+        return DownloadFailure(row['reason'], row['failures'], row['retry_after'])
+
+    async def delete_download_failures(self, uri: str) -> None:
+        async with self._acquire_for_write() as conn:
+            await conn.execute_query(Query.DELETE_DOWNLOAD_FAILURES, uri)
+
+    async def delete_expired_download_failures(self, older_than: timedelta) -> int:
+        async with self._acquire_for_write() as conn:
+            status = await conn.execute_query(Query.DELETE_EXPIRED_DOWNLOAD_FAILURES, older_than)
+        # DELETE <count>
+        return int(status.split()[-1])
+
+    async def store_song_link(self, song_url: str, song_link: str | None, *, ttl: timedelta | None = None) -> None:
+        # `None` link is stored as a negative entry, without ttl the entry never expires
+        async with self._acquire_for_write() as conn, conn.transaction():
+            await conn.fetch_query(Query.STORE_SONG_LINK, song_url, song_link, ttl)
+
+    async def get_song_link(self, song_url: str) -> CachedSongLink | None:
+        song_link = await self._read(
+            lambda conn: conn.fetchrow_query(Query.GET_SONG_LINK, song_url),
+            miss_on_primary=True,
+        )
+        if song_link is None:
+            return None
+        return CachedSongLink(None if song_link['is_negative'] else song_link['song_link'])
+
+    async def delete_expired_song_links(self) -> int:
+        async with self._acquire_for_write() as conn:
+            status = await conn.execute_query(Query.DELETE_EXPIRED_SONG_LINKS)
+        # DELETE <count>
+        return int(status.split()[-1])
+
+    async def cache_local_tracks(self, tracks: Sequence[LocalTrackRow]) -> list[str]:
+        if not tracks:
+            return []
+
+        args = (
+            [track.platform_type.value for track in tracks],
+            [track.url for track in tracks],
+            [track.artist for track in tracks],
+            [track.name for track in tracks],
+        )
+        async with self._acquire_for_write() as conn:
+            rows = await conn.fetch_query(Query.CACHE_LOCAL_TRACKS, *args)
+            if any(row['id'] is None for row in rows):
+                # Raced with another insert of the same track that wasn't visible to our snapshot, it is now though
+                rows = await conn.fetch_query(Query.CACHE_LOCAL_TRACKS, *args)
+
+        return [str(row['id']) for row in rows]
 
     async def get_cached_local_track_info(self, our_id: str) -> CachedLocalTrack | None:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn:
-            local_track = await conn.fetchval(
-                'SELECT (id, platform_name, url, artist, name) FROM local_tracks WHERE id = $1 LIMIT 1',
-                our_id,
-            )
+        # The id was most likely just generated by another process, so a miss on the replica doesn't mean much
+        local_track = await self._read(
+            lambda conn: conn.fetchval_query(Query.GET_CACHED_LOCAL_TRACK_INFO, our_id),
+            miss_on_primary=True,
+        )
 
         if local_track is None:
-            return None
+            # Old ids are still valid, they are just not in the hot table anymore
+            local_track = await self._read(
+                lambda conn: conn.fetchval_query(Query.GET_ARCHIVED_LOCAL_TRACK_INFO, our_id),
+                miss_on_primary=True,
+            )
+            if local_track is None:
+                return None
+        elif datetime.now(UTC) - local_track[5] > LOCAL_TRACK_TOUCH_INTERVAL:
+            async with self._acquire_for_write() as conn:
+                await conn.execute_query(Query.TOUCH_LOCAL_TRACK, our_id)
 
         return CachedLocalTrack(
             id=str(local_track[0]),
@@ -212,63 +620,133 @@ class Database:
             name=local_track[4],
         )
 
+    async def archive_local_tracks(self, unused_for: timedelta, batch_size: int) -> int:
+        # Batches are committed one by one, so that the first sweep over a huge table isn't one giant transaction
+        archived = 0
+        while True:
+            async with self._acquire_for_write() as conn:
+                count = await conn.fetchval_query(Query.ARCHIVE_LOCAL_TRACKS, unused_for, batch_size)
+
+            archived += count
+            if count < batch_size:
+                return archived
+
     async def get_user_config(self, user_id: int) -> UserConfig:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn:
-            result = await conn.fetchrow(
-                'SELECT * FROM user_configs WHERE user_id = $1 LIMIT 1',
-                user_id,
+        user_config = self.user_configs.get(user_id)
+        if user_config is not None:
+            return user_config
+
+        # NOTE(es3n1n): Configs are always read from the primary, otherwise we could cache a stale config from a lagging
+        #   replica after the NOTIFY has already evicted it
+        epoch = self._user_configs_epoch
+        async with self._acquire() as conn:
+            result = await conn.fetchrow_query(Query.GET_USER_CONFIG, user_id)
+
+        user_config = UserConfig() if result is None else UserConfig.from_record(result)
+        if epoch == self._user_configs_epoch:
+            self.user_configs.put(user_id, user_config)
+        return user_config
+
+    async def get_user_context(self, telegram_id: int) -> UserContext:
+        # Configs are served from the cache whenever possible, only the tokens are fetched then
+        user_config = self.user_configs.get(telegram_id)
+        if user_config is not None:
+            tokens_row = await self._read(
+                lambda conn: conn.fetchval_query(Query.GET_USER_TOKENS, telegram_id),
+                miss_on_primary=True,
             )
-            if result is None:
-                return UserConfig()
-            return UserConfig.model_validate(dict(result))
+        else:
+            epoch = self._user_configs_epoch
+            async with self._acquire() as conn:
+                result = await conn.fetchrow_query(Query.GET_USER_CONTEXT, telegram_id)
+
+            config_row = result['config'] if result else None
+            tokens_row = result['tokens'] if result else None
+
+            user_config = UserConfig() if config_row is None else UserConfig.from_record(config_row)
+            if epoch == self._user_configs_epoch:
+                self.user_configs.put(telegram_id, user_config)
+
+        tokens_row = tokens_row or {}
+        return UserContext(
+            telegram_id=telegram_id,
+            user_config=user_config,
+            tokens={SongLinkPlatformType(platform_name): token for platform_name, token in tokens_row.items()},
+        )
 
     async def update_config_var(self, user_id: int, field: str, *, new_value: bool) -> None:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn, conn.transaction():
-            await conn.execute(
-                'SELECT update_user_config_value($1, $2, $3)',
-                user_id,
-                field,
-                new_value,
+        try:
+            async with self._acquire_for_write() as conn, conn.transaction():
+                # Other workers will be notified from within the function
+                await conn.execute(
+                    'SELECT update_user_config_value($1, $2, $3)',
+                    user_id,
+                    field,
+                    new_value,
+                )
+        finally:
+            # Do not wait for the NOTIFY roundtrip for our own process
+            self._invalidate_user_configs(user_id)
+
+    async def strip_user_id_from_cached_files(self, user_id: int, batch_size: int) -> int:
+        # Batches are committed one by one, so the rows are never locked for long
+        stripped = 0
+        while True:
+            async with self._acquire_for_write() as conn:
+                status = await conn.execute_query(Query.STRIP_USER_ID_FROM_CACHED_FILES, user_id, batch_size)
+
+            # UPDATE <count>
+            count = int(status.split()[-1])
+            stripped += count
+            if count < batch_size:
+                return stripped
+
+    async def get_users_to_strip(self) -> list[int]:
+        async with self._acquire() as conn:
+            rows = await conn.fetch_query(Query.GET_USERS_TO_STRIP)
+        return [row['user_id'] for row in rows]
+
+    async def get_cached_files_count_for_user(self, user_id: int) -> int:
+        count = await self._read(lambda conn: conn.fetchval_query(Query.GET_CACHED_FILES_COUNT_FOR_USER, user_id))
+        return count or 0
+
+    async def increment_sent_tracks_counts(self, counts: dict[int, int]) -> None:
+        # Sorted to always lock the rows in the same order, otherwise concurrent flushes might deadlock
+        user_ids = sorted(counts)
+        async with self._acquire_for_write() as conn, conn.transaction():
+            await conn.fetch_query(
+                Query.INCREMENT_SENT_TRACKS_COUNTS,
+                user_ids,
+                [counts[user_id] for user_id in user_ids],
             )
 
-    async def strip_user_id_from_cached_files(self, user_id: int) -> None:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn, conn.transaction():
+    async def bulk_increment_track_stats(self, counts: dict[int, int]) -> None:
+        # Same as `increment_sent_tracks_counts`, but via COPY for the huge batches
+        if not counts:
+            return
+
+        async with self._acquire_for_write() as conn, conn.transaction():
             await conn.execute(
-                'UPDATE cached_files SET cached_by_user_id = NULL WHERE cached_by_user_id = $1',
-                user_id,
+                'CREATE TEMP TABLE IF NOT EXISTS user_track_stats_staging ('
+                'user_id BIGINT NOT NULL, '
+                'track_count INT NOT NULL'
+                ') ON COMMIT DELETE ROWS'
             )
-
-    async def get_cached_files_count_for_user(self, user_id: int) -> int:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn:
-            count = await conn.fetchval(
-                'SELECT COUNT(*) FROM cached_files WHERE cached_by_user_id = $1',
-                user_id,
+            await conn.copy_records_to_table(
+                'user_track_stats_staging',
+                records=sorted(counts.items()),
+                columns=('user_id', 'track_count'),
             )
-            return count or 0
-
-    async def increment_sent_tracks_count(self, user_id: int) -> None:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn, conn.transaction():
             await conn.execute(
                 'INSERT INTO user_track_stats (user_id, track_count) '
-                'VALUES ($1, 1) '
-                'ON CONFLICT (user_id) DO '
-                'UPDATE SET track_count = user_track_stats.track_count + 1;',
-                user_id,
+                # Sorted to always lock the rows in the same order
+                'SELECT user_id, track_count FROM user_track_stats_staging ORDER BY user_id '
+                'ON CONFLICT (user_id) DO UPDATE SET track_count = user_track_stats.track_count + EXCLUDED.track_count;'
             )
 
     async def get_user_sent_tracks_count(self, user_id: int) -> int:
-        pool = await self.get_pool()
-        async with pool.acquire() as conn:
-            count = await conn.fetchval(
-                'SELECT track_count FROM user_track_stats WHERE user_id = $1 LIMIT 1',
-                user_id,
-            )
-            return count or 0
+        count = await self._read(lambda conn: conn.fetchval_query(Query.GET_USER_SENT_TRACKS_COUNT, user_id))
+        return count or 0
 
 
 db = Database()
@@ -0,0 +1,75 @@
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from time import perf_counter
+
+
+@dataclass
+class LatencyStats:
+    count: int = 0
+    total_sec: float = 0.0
+    max_sec: float = 0.0
+
+    def observe(self, elapsed_sec: float) -> None:
+        self.count += 1
+        self.total_sec += elapsed_sec
+        self.max_sec = max(self.max_sec, elapsed_sec)
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_sec / self.count * 1000 if self.count else 0.0
+
+    def __str__(self) -> str:
+        """Human-readable summary, used in the periodic report."""
+        return f'{self.count} calls, avg {self.mean_ms:.2f}ms, max {self.max_sec * 1000:.2f}ms'
+
+
+class DatabaseMetrics:
+    """Per-process pool metrics, counters are collected for the current report window."""
+
+    def __init__(self) -> None:
+        self.acquire = LatencyStats()
+        self.queries: defaultdict[str, LatencyStats] = defaultdict(LatencyStats)
+
+        self.in_use: int = 0
+        self.peak_in_use: int = 0
+
+    @contextmanager
+    def measure(self, stats: LatencyStats) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            stats.observe(perf_counter() - start)
+
+    @contextmanager
+    def measure_query(self, name: str) -> Iterator[None]:
+        with self.measure(self.queries[name]):
+            yield
+
+    @contextmanager
+    def track_in_use(self) -> Iterator[None]:
+        self.in_use += 1
+        self.peak_in_use = max(self.peak_in_use, self.in_use)
+        try:
+            yield
+        finally:
+            self.in_use -= 1
+
+    def report(self, pool_size: int, pool_max_size: int) -> list[str]:
+        lines = [
+            f'pool: {self.in_use}/{pool_size} in use (peak {self.peak_in_use}, max {pool_max_size})',
+            f'acquire: {self.acquire}',
+        ]
+        # Slowest queries first, these are the ones we care about
+        lines.extend(
+            f'{name}: {stats}'
+            for name, stats in sorted(self.queries.items(), key=lambda item: item[1].total_sec, reverse=True)
+        )
+        return lines
+
+    def reset(self) -> None:
+        self.acquire = LatencyStats()
+        self.queries.clear()
+        self.peak_in_use = self.in_use
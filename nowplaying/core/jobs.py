@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from nowplaying.core.config import config
+from nowplaying.core.database import db
+from nowplaying.core.leader import leader
+from nowplaying.util.logger import logger
+from nowplaying.util.periodic import PeriodicTask
+
+
+async def sweep_song_links() -> None:
+    deleted = await db.delete_expired_song_links()
+    if deleted:
+        logger.info(f'Swept {deleted} expired song links')
+
+
+async def sweep_download_failures() -> None:
+    deleted = await db.delete_expired_download_failures(timedelta(seconds=config.DOWNLOAD_FAILURE_MAX_BACKOFF_SEC))
+    if deleted:
+        logger.info(f'Swept {deleted} expired download failures')
+
+
+async def archive_local_tracks() -> None:
+    archived = await db.archive_local_tracks(
+        timedelta(days=config.LOCAL_TRACKS_ARCHIVE_AFTER_DAYS), config.LOCAL_TRACKS_ARCHIVE_BATCH_SIZE
+    )
+    if archived:
+        logger.info(f'Archived {archived} unused local tracks')
+
+
+async def strip_opted_out_users() -> None:
+    for user_id in await db.get_users_to_strip():
+        stripped = await db.strip_user_id_from_cached_files(user_id, config.CACHED_FILES_STRIP_BATCH_SIZE)
+        logger.info(f'Stripped user id from {stripped} cached files')
+
+
+# Database maintenance jobs, these are running only within the leader process (see `nowplaying.core.leader`)
+JOBS: tuple[PeriodicTask, ...] = (
+    PeriodicTask(sweep_song_links, config.SONG_LINK_SWEEP_INTERVAL_SEC, name='song_links_sweep'),
+    PeriodicTask(sweep_download_failures, config.DOWNLOAD_FAILURES_SWEEP_INTERVAL_SEC, name='download_failures_sweep'),
+    PeriodicTask(archive_local_tracks, config.LOCAL_TRACKS_ARCHIVE_INTERVAL_SEC, name='local_tracks_archive'),
+    PeriodicTask(strip_opted_out_users, config.CACHED_FILES_STRIP_INTERVAL_SEC, name='cached_files_strip'),
+)
+
+
+async def _on_leadership_change(*, is_leader: bool) -> None:
+    for job in JOBS:
+        if is_leader:
+            job.start()
+        else:
+            await job.stop()
+
+
+leader.on_change(_on_leadership_change)
+
+
+# Every process is taking part in the election, so that the jobs would keep running as long as any of them is alive
+async def start_jobs() -> None:
+    await leader.start()
+
+
+async def stop_jobs() -> None:
+    await leader.stop()
@@ -0,0 +1,98 @@
+from typing import TYPE_CHECKING, Protocol
+
+from asyncpg.exceptions import InterfaceError, PostgresError
+
+from nowplaying.core.config import config
+from nowplaying.core.database import db
+from nowplaying.util.logger import logger
+from nowplaying.util.periodic import PeriodicTask
+
+
+if TYPE_CHECKING:
+    from asyncpg import Connection
+
+
+# 'now' 'lead', see `MIGRATIONS_LOCK_KEY` for the other one
+LEADER_LOCK_KEY = 0x6E6F77_6C656164
+
+LEADER_ERRORS = (OSError, TimeoutError, InterfaceError, PostgresError)
+
+
+class LeadershipCallback(Protocol):
+    async def __call__(self, *, is_leader: bool) -> None: ...
+
+
+class LeaderElection:
+    """Session-level advisory lock on a dedicated connection, whichever process holds it is the leader."""
+
+    def __init__(self, lock_key: int, name: str) -> None:
+        self.lock_key = lock_key
+        self.name = name
+        self.is_leader: bool = False
+
+        self._conn: Connection | None = None
+        self._callbacks: list[LeadershipCallback] = []
+        self._renew_task = PeriodicTask(self._renew, config.LEADER_RENEW_INTERVAL_SEC, name=f'{name}_leader_renew')
+
+    def on_change(self, callback: LeadershipCallback) -> None:
+        self._callbacks.append(callback)
+
+    async def start(self) -> None:
+        await self._renew()
+        self._renew_task.start()
+
+    async def stop(self) -> None:
+        await self._renew_task.stop()
+        # Step down before releasing the lock, so that the next leader never overlaps with us
+        await self._set_leader(is_leader=False)
+        await self._close_connection()
+
+    async def _renew(self) -> None:
+        try:
+            if self._conn is None:
+                self._conn = await db.connect()
+
+            # NOTE(es3n1n): The lock is held for as long as our session lives, so renewing the lease is just making sure
+            #   that the connection is still alive. The timeout is there to notice a dead connection before the server
+            #   does, otherwise we could end up with two leaders for a while
+            if self.is_leader:
+                await self._conn.fetchval('SELECT 1', timeout=config.LEADER_RENEW_INTERVAL_SEC)
+                return
+
+            acquired = await self._conn.fetchval(
+                'SELECT pg_try_advisory_lock($1)', self.lock_key, timeout=config.LEADER_RENEW_INTERVAL_SEC
+            )
+        except LEADER_ERRORS as err:
+            logger.warning(f'Lost the {self.name} leader election connection: {err}')
+            await self._set_leader(is_leader=False)
+            await self._close_connection()
+            return
+
+        await self._set_leader(is_leader=acquired)
+
+    async def _set_leader(self, *, is_leader: bool) -> None:
+        if is_leader == self.is_leader:
+            return
+
+        self.is_leader = is_leader
+        logger.info(f'{"Became" if is_leader else "No longer"} the {self.name} leader')
+        for callback in self._callbacks:
+            try:
+                await callback(is_leader=is_leader)
+            except Exception as err:  # noqa: BLE001
+                logger.opt(exception=err).error(f'{self.name} leadership callback failed')
+
+    async def _close_connection(self) -> None:
+        if self._conn is None:
+            return
+
+        conn, self._conn = self._conn, None
+        # Releases the lock if we're still holding it
+        try:
+            await conn.close(timeout=config.LEADER_RENEW_INTERVAL_SEC)
+        except LEADER_ERRORS:
+            conn.terminate()
+
+
+# Singleton background jobs (see `nowplaying.core.jobs`) are running only within the leader process
+leader = LeaderElection(LEADER_LOCK_KEY, 'jobs')
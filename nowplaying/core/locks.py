@@ -0,0 +1,123 @@
+from asyncio import Future, Lock, get_running_loop, wait_for
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager, suppress
+from hashlib import blake2b
+from typing import TYPE_CHECKING, Any
+
+from asyncpg.exceptions import InterfaceError, PostgresError
+
+from nowplaying.core.config import config
+from nowplaying.core.database import db
+from nowplaying.util.asyncio import LockManager
+from nowplaying.util.logger import logger
+
+
+if TYPE_CHECKING:
+    from asyncpg import Pool
+    from asyncpg.pool import PoolConnectionProxy
+
+
+# NOTIFY might get lost (e.g. while the listener is reconnecting), so the waiters are retrying every N seconds anyway
+LOCK_POLL_INTERVAL_SEC = 5
+
+LOCK_ERRORS = (OSError, TimeoutError, InterfaceError, PostgresError)
+
+
+class ClusterLockManager:
+    """`LockManager` that's also holding a Postgres advisory lock, waiters are woken up via NOTIFY on release."""
+
+    def __init__(self, namespace: int, channel: str) -> None:
+        # Two-int advisory lock keys, the namespace is the first one
+        self.namespace = namespace
+        self.channel = channel
+
+        self._local = LockManager()
+        self._waiters: dict[str, list[Future[None]]] = {}
+        self._pool: Pool | None = None
+        self._pool_lock = Lock()
+        db.listen(channel, self._on_released)
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await pool.close()
+
+    @staticmethod
+    def lock_id(key: str) -> int:
+        # Stable across the processes unlike `hash`, and positive so that it matches `pg_locks.objid` as is
+        return int.from_bytes(blake2b(key.encode(), digest_size=4).digest()) & 0x7FFFFFFF
+
+    async def is_locked(self, key: str) -> bool:
+        if self._local.is_locked(key):
+            return True
+        return await db.is_advisory_lock_held(self.namespace, self.lock_id(key))
+
+    @asynccontextmanager
+    async def lock(self, key: str) -> AsyncGenerator[None, Any]:
+        # Local lock first, so that only one task per process is waiting on the database
+        async with self._local.lock(key):
+            pool = await self._get_pool()
+            conn = await self._acquire(pool, key)
+            try:
+                yield
+            finally:
+                await self._release(pool, conn, key)
+
+    async def _get_pool(self) -> 'Pool':
+        # NOTE(es3n1n): Session-level locks are held for as long as the work takes (downloads could take minutes), so
+        #   these are using their own small pool instead of starving the main one. Once all of its connections are
+        #   taken, the acquisitions are waiting for one rather than opening more
+        async with self._pool_lock:
+            if self._pool is None:
+                self._pool = await db.create_session_pool(config.CLUSTER_LOCK_MAX_CONNECTIONS)
+            return self._pool
+
+    async def _acquire(self, pool: 'Pool', key: str) -> 'PoolConnectionProxy':
+        while True:
+            # Registered before trying, otherwise we could miss the NOTIFY that's sent right after our attempt
+            waiter: Future[None] = get_running_loop().create_future()
+            self._waiters.setdefault(key, []).append(waiter)
+            try:
+                conn = await pool.acquire()
+                try:
+                    locked = await conn.fetchval(
+                        'SELECT pg_try_advisory_lock($1, $2)', self.namespace, self.lock_id(key)
+                    )
+                except BaseException:
+                    # We don't know whether the lock was taken, terminating the session releases it for sure
+                    conn.terminate()
+                    await pool.release(conn)
+                    raise
+
+                if locked:
+                    return conn
+
+                # Waiting without holding a connection
+                await pool.release(conn)
+                with suppress(TimeoutError):
+                    await wait_for(waiter, LOCK_POLL_INTERVAL_SEC)
+            finally:
+                self._remove_waiter(key, waiter)
+
+    async def _release(self, pool: 'Pool', conn: 'PoolConnectionProxy', key: str) -> None:
+        try:
+            await conn.execute('SELECT pg_advisory_unlock($1, $2)', self.namespace, self.lock_id(key))
+            await conn.execute('SELECT pg_notify($1, $2)', self.channel, key)
+        except LOCK_ERRORS as err:
+            # The lock is released with the session anyway, waiters would notice it on their next poll
+            logger.warning(f'Unable to release the {self.channel} lock for {key}: {err}')
+            conn.terminate()
+        finally:
+            await pool.release(conn)
+
+    def _remove_waiter(self, key: str, waiter: Future[None]) -> None:
+        waiters = self._waiters.get(key, [])
+        if waiter in waiters:
+            waiters.remove(waiter)
+        if not waiters:
+            self._waiters.pop(key, None)
+
+    def _on_released(self, key: str) -> None:
+        for waiter in self._waiters.get(key, []):
+            if not waiter.done():
+                waiter.set_result(None)
@@ -1,5 +1,5 @@
-# TODO(es3n1n): this is rather a temporary measure. not sure where to put this yet, sorry
-DATABASE_INIT_SQL: str = """
+-- The schema as it was before versioned migrations, every statement is idempotent on purpose
+
 CREATE TABLE IF NOT EXISTS tokens
 (
     id SERIAL PRIMARY KEY,
@@ -80,6 +80,9 @@ BEGIN
     -- Update the specified field for the user
     EXECUTE format('UPDATE user_configs SET %I = $1 WHERE user_id = $2', field_name)
     USING field_value, p_user_id;
+
+    -- Let every worker know that its cached config is stale (delivered on commit)
+    PERFORM pg_notify('user_configs', p_user_id::TEXT);
 END;
 $$ LANGUAGE plpgsql;
 
@@ -112,4 +115,3 @@ BEGIN
     RETURN NEXT;
 END;
 $$ LANGUAGE plpgsql;
-"""
@@ -0,0 +1,43 @@
+-- Plain nullable columns without defaults are a catalog-only change, unlike generated ones they don't rewrite the
+-- whole table under an exclusive lock. They're kept in sync with `quality_info` by the trigger below and the
+-- existing rows are backfilled in batches by the next migration
+ALTER TABLE cached_files
+    ADD COLUMN IF NOT EXISTS bit_depth INT,
+    ADD COLUMN IF NOT EXISTS bitrate_kbps NUMERIC,
+    ADD COLUMN IF NOT EXISTS sample_rate_khz NUMERIC,
+    ADD COLUMN IF NOT EXISTS marked_as_highest_available BOOLEAN;
+
+CREATE OR REPLACE FUNCTION sync_cached_file_quality_columns() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.bit_depth := (NEW.quality_info ->> 'bit_depth')::INT;
+    NEW.bitrate_kbps := (NEW.quality_info ->> 'bitrate_kbps')::NUMERIC;
+    NEW.sample_rate_khz := (NEW.quality_info ->> 'sample_rate_khz')::NUMERIC;
+    NEW.marked_as_highest_available := COALESCE((NEW.quality_info ->> 'marked_as_highest_available')::BOOLEAN, FALSE);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS sync_cached_file_quality_columns ON cached_files;
+CREATE TRIGGER sync_cached_file_quality_columns
+    BEFORE INSERT OR UPDATE OF quality_info ON cached_files
+    FOR EACH ROW EXECUTE FUNCTION sync_cached_file_quality_columns();
+
+-- Commits after every batch, so it has to be called outside of a transaction block
+CREATE OR REPLACE PROCEDURE backfill_cached_file_quality_columns(batch_size INT) AS $$
+DECLARE
+    last_id INT := 0;
+    max_id INT;
+BEGIN
+    -- Rows inserted after this point are already covered by the trigger
+    SELECT COALESCE(MAX(id), 0) INTO max_id FROM cached_files;
+    WHILE last_id < max_id LOOP
+        UPDATE cached_files SET quality_info = quality_info
+        WHERE id > last_id AND id <= last_id + batch_size AND marked_as_highest_available IS NULL;
+        last_id := last_id + batch_size;
+        COMMIT;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP INDEX IF EXISTS highest_available;
+DROP INDEX IF EXISTS marked_as_highest_available;
@@ -0,0 +1,5 @@
+-- no-transaction
+-- Backfilled before building the index, so that the batches don't have to maintain it
+CALL backfill_cached_file_quality_columns(10000);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS cached_files_quality_lookup
+    ON cached_files (uri, highest_available, marked_as_highest_available);
@@ -0,0 +1,5 @@
+-- Local track ids are assigned in bulk by a single statement now, see `Database.cache_local_tracks`.
+-- The function stays for this release, workers still running the previous one call it during a rolling deploy.
+-- TODO: Drop it in a migration of the next release, once no worker is calling it
+COMMENT ON FUNCTION cache_local_track_id(VARCHAR, VARCHAR, VARCHAR, VARCHAR)
+    IS 'Deprecated, unused since `Database.cache_local_tracks` assigns the ids in bulk';
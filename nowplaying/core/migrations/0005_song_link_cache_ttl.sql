@@ -0,0 +1,10 @@
+-- Song links are cached for every platform now, including the ones that couldn't be resolved (negative entries).
+-- Rows without a ttl (everything cached before this migration) never expire
+ALTER TABLE cached_song_link_urls
+    ALTER COLUMN song_link DROP NOT NULL,
+    ADD COLUMN IF NOT EXISTS resolved_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    ADD COLUMN IF NOT EXISTS ttl INTERVAL,
+    ADD COLUMN IF NOT EXISTS is_negative BOOLEAN NOT NULL DEFAULT FALSE;
+
+CREATE INDEX IF NOT EXISTS cached_song_link_urls_expiring
+    ON cached_song_link_urls (resolved_at) WHERE ttl IS NOT NULL;
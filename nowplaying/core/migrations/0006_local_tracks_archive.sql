@@ -0,0 +1,20 @@
+-- Local tracks that weren't looked up for a while are moved to the archive, so that the hot (platform_name, url)
+-- index stays small. Existing rows are considered used right now, otherwise the first sweep would archive everything
+ALTER TABLE local_tracks
+    ADD COLUMN IF NOT EXISTS last_used_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+-- Duplicates the index behind the UNIQUE (platform_name, url) constraint
+DROP INDEX IF EXISTS local_track_idx;
+
+-- Ids are never reused, the same track might be archived more than once though (with different ids)
+CREATE TABLE IF NOT EXISTS local_tracks_archive
+(
+    id UUID PRIMARY KEY,
+    inserted_at TIMESTAMP,
+    last_used_at TIMESTAMPTZ NOT NULL,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    platform_name VARCHAR,
+    url VARCHAR,
+    artist VARCHAR,
+    name VARCHAR
+);
@@ -0,0 +1,67 @@
+-- Per-user cached files counters, maintained by the triggers below so that reading them is a primary key lookup
+CREATE TABLE IF NOT EXISTS user_cache_stats
+(
+    user_id BIGINT PRIMARY KEY,
+    cached_files_count BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION apply_user_cache_stats_deltas(
+    p_added BIGINT[],
+    p_removed BIGINT[]
+) RETURNS VOID AS $$
+BEGIN
+    INSERT INTO user_cache_stats (user_id, cached_files_count)
+    SELECT user_id, SUM(delta) FROM (
+        SELECT unnest(p_added) AS user_id, 1 AS delta
+        UNION ALL
+        SELECT unnest(p_removed), -1
+    ) deltas
+    WHERE user_id IS NOT NULL
+    GROUP BY user_id
+    HAVING SUM(delta) <> 0
+    -- Always lock the counters in the same order, otherwise concurrent writes might deadlock
+    ORDER BY user_id
+    ON CONFLICT (user_id) DO UPDATE
+    SET cached_files_count = user_cache_stats.cached_files_count + EXCLUDED.cached_files_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement level, so bulk inserts (see `Database.bulk_store_cached_files`) update every counter only once
+CREATE OR REPLACE FUNCTION update_user_cache_stats() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM apply_user_cache_stats_deltas(ARRAY(SELECT cached_by_user_id FROM new_rows), '{}');
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM apply_user_cache_stats_deltas(
+            ARRAY(SELECT cached_by_user_id FROM new_rows),
+            ARRAY(SELECT cached_by_user_id FROM old_rows)
+        );
+    ELSE
+        PERFORM apply_user_cache_stats_deltas('{}', ARRAY(SELECT cached_by_user_id FROM old_rows));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables can't be shared between multiple events, hence the three triggers
+CREATE OR REPLACE TRIGGER cached_files_stats_insert
+    AFTER INSERT ON cached_files
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_user_cache_stats();
+
+CREATE OR REPLACE TRIGGER cached_files_stats_update
+    AFTER UPDATE ON cached_files
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_user_cache_stats();
+
+CREATE OR REPLACE TRIGGER cached_files_stats_delete
+    AFTER DELETE ON cached_files
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_user_cache_stats();
+
+-- Creating the triggers has locked cached_files for writes until the end of this migration, so nothing is missed here
+INSERT INTO user_cache_stats (user_id, cached_files_count)
+SELECT cached_by_user_id, COUNT(*) FROM cached_files
+WHERE cached_by_user_id IS NOT NULL
+GROUP BY cached_by_user_id
+ON CONFLICT (user_id) DO UPDATE SET cached_files_count = EXCLUDED.cached_files_count;
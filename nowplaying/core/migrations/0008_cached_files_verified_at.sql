@@ -0,0 +1,5 @@
+-- Telegram file ids are re-verified only once in a while, the ones that turned out to be dead are marked for refresh
+--   and are not served anymore until they are cached again
+ALTER TABLE cached_files
+    ADD COLUMN IF NOT EXISTS verified_at TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS needs_refresh BOOLEAN NOT NULL DEFAULT FALSE;
@@ -0,0 +1,14 @@
+-- Negative cache of the downloads, tracks that failed are not downloaded again until `retry_after`.
+-- The backoff is doubled on every consecutive failure, see `Query.STORE_DOWNLOAD_FAILURE`
+CREATE TABLE IF NOT EXISTS download_failures
+(
+    uri VARCHAR NOT NULL,
+    highest_available BOOLEAN NOT NULL,
+    reason TEXT NOT NULL,
+    failures INT NOT NULL DEFAULT 1,
+    failed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    retry_after TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (uri, highest_available)
+);
+
+CREATE INDEX IF NOT EXISTS download_failures_retry_after ON download_failures (retry_after);
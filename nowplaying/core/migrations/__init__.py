@@ -0,0 +1,131 @@
+from asyncio import sleep
+from dataclasses import dataclass
+from functools import cache
+from pathlib import Path
+from re import compile as re_compile
+
+from asyncpg import Connection
+from asyncpg.pool import PoolConnectionProxy
+
+from nowplaying.util.logger import logger
+
+
+MIGRATIONS_DIR = Path(__file__).parent
+MIGRATION_FILE_REGEX = re_compile(r'^(\d{4})_(\w+)\.sql$')
+
+# Migrations starting with this line are applied outside a transaction, statement by statement.
+# Needed for stuff like `CREATE INDEX CONCURRENTLY`, statements there must be separated by `;` at the end of a line.
+NO_TRANSACTION_MARKER = '-- no-transaction'
+
+# Arbitrary key for `pg_advisory_lock`, so that only one worker is migrating at a time
+MIGRATIONS_LOCK_KEY = 0x6E6F77_706C6179
+# Workers that didn't get the lock are retrying every N seconds
+MIGRATIONS_LOCK_POLL_INTERVAL_SEC = 1
+
+SCHEMA_MIGRATIONS_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations
+(
+    version INT PRIMARY KEY,
+    name VARCHAR NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    sql: str
+
+    @property
+    def is_transactional(self) -> bool:
+        return not self.sql.startswith(NO_TRANSACTION_MARKER)
+
+    @property
+    def statements(self) -> list[str]:
+        return [statement.strip() for statement in self.sql.split(';\n') if statement.strip()]
+
+    def __str__(self) -> str:
+        """Format the migration just like its file name."""
+        return f'{self.version:04d}_{self.name}'
+
+
+@cache
+def load_migrations() -> tuple[Migration, ...]:
+    migrations: dict[int, Migration] = {}
+
+    for path in MIGRATIONS_DIR.glob('*.sql'):
+        match = MIGRATION_FILE_REGEX.match(path.name)
+        if match is None:
+            msg = f'Invalid migration file name: {path.name}'
+            raise ValueError(msg)
+
+        migration = Migration(version=int(match.group(1)), name=match.group(2), sql=path.read_text())
+        if migration.version in migrations:
+            msg = f'Duplicate migration version: {migration} and {migrations[migration.version]}'
+            raise ValueError(msg)
+
+        migrations[migration.version] = migration
+
+    return tuple(migrations[version] for version in sorted(migrations))
+
+
+async def get_schema_version(conn: Connection | PoolConnectionProxy) -> int:
+    if await conn.fetchval("SELECT to_regclass('schema_migrations')") is None:
+        return 0
+    return await conn.fetchval('SELECT COALESCE(MAX(version), 0) FROM schema_migrations')
+
+
+async def _mark_applied(conn: Connection | PoolConnectionProxy, migration: Migration) -> None:
+    await conn.execute(
+        'INSERT INTO schema_migrations (version, name) VALUES ($1, $2)',
+        migration.version,
+        migration.name,
+    )
+
+
+async def _apply(conn: Connection | PoolConnectionProxy, migration: Migration) -> None:
+    logger.info(f'Applying migration {migration}')
+
+    if not migration.is_transactional:
+        for statement in migration.statements:
+            await conn.execute(statement)
+        await _mark_applied(conn, migration)
+        return
+
+    async with conn.transaction():
+        await conn.execute(migration.sql)
+        await _mark_applied(conn, migration)
+
+
+async def migrate(conn: Connection | PoolConnectionProxy) -> None:
+    migrations = load_migrations()
+    latest_version = migrations[-1].version if migrations else 0
+
+    # Fast path, no locks needed if everything is up to date
+    if await get_schema_version(conn) >= latest_version:
+        return
+
+    # NOTE(es3n1n): Not blocking in `pg_advisory_lock`, `CREATE INDEX CONCURRENTLY` waits out every older snapshot,
+    #   including the one of a backend that's sitting in that `SELECT`. So the worker that holds the lock would be
+    #   waiting for the ones that are waiting for it
+    while not await conn.fetchval('SELECT pg_try_advisory_lock($1)', MIGRATIONS_LOCK_KEY):
+        await sleep(MIGRATIONS_LOCK_POLL_INTERVAL_SEC)
+
+        # Applied by whoever was holding the lock
+        if await get_schema_version(conn) >= latest_version:
+            return
+
+    try:
+        await conn.execute(SCHEMA_MIGRATIONS_SQL)
+        # Re-read under the lock, someone might've applied them while we were waiting
+        applied = {row['version'] for row in await conn.fetch('SELECT version FROM schema_migrations')}
+
+        for migration in migrations:
+            if migration.version not in applied:
+                await _apply(conn, migration)
+    finally:
+        await conn.execute('SELECT pg_advisory_unlock($1)', MIGRATIONS_LOCK_KEY)
+
+    logger.info(f'Database schema is at version {latest_version}')
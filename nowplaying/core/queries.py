@@ -0,0 +1,181 @@
+from enum import Enum, unique
+
+
+# NOTE(es3n1n): The statement cache is sized so that every query in here stays prepared on each pooled connection,
+#   names are used in the metrics reports
+@unique
+class Query(Enum):
+    IS_USER_AUTHORIZED_GLOBALLY = 'SELECT 1 FROM tokens WHERE telegram_id = $1 LIMIT 1'
+    IS_USER_AUTHORIZED = 'SELECT 1 FROM tokens WHERE telegram_id = $1 AND platform_name = $2 LIMIT 1'
+    GET_USER_AUTHORIZED_PLATFORMS = 'SELECT (platform_name) FROM tokens WHERE telegram_id = $1'
+    STORE_USER_TOKEN = (
+        'INSERT INTO tokens (telegram_id, platform_name, token) VALUES ($1, $2, $3) '  # noqa: S105
+        'ON CONFLICT (telegram_id, platform_name) DO UPDATE SET token = $3'
+    )
+    GET_USER_TOKEN = 'SELECT (token) FROM tokens WHERE telegram_id = $1 AND platform_name = $2 LIMIT 1'  # noqa: S105
+
+    # Freshly uploaded file ids are known to be alive
+    STORE_CACHED_FILE = (
+        'INSERT INTO cached_files (uri, file_id, cached_by_user_id, quality_info, verified_at) '
+        'VALUES ($1, $2, $3, $4, now()) '
+        'ON CONFLICT (uri, highest_available) DO UPDATE '
+        'SET '
+        'file_id = EXCLUDED.file_id, '
+        'cached_by_user_id = EXCLUDED.cached_by_user_id, '
+        'quality_info = EXCLUDED.quality_info, '
+        'verified_at = EXCLUDED.verified_at, '
+        'needs_refresh = FALSE;'
+    )
+    # Prefetched files are stored without an owner, the first user that chooses one gets it
+    CLAIM_CACHED_FILE = (
+        'UPDATE cached_files SET cached_by_user_id = $3 WHERE uri = $1 AND file_id = $2 AND cached_by_user_id IS NULL'
+    )
+    # Files that failed the verification are treated as missing, so that they would be cached again
+    GET_CACHED_FILE = (
+        'SELECT * FROM cached_files WHERE uri = $1 '
+        # direct quality match, or the same file for both qualities
+        'AND (highest_available = $2 OR marked_as_highest_available) '
+        'AND NOT needs_refresh '
+        'LIMIT 1'
+    )
+    # Same as above for a bunch of uris at once, direct quality matches are preferred
+    GET_CACHED_FILES = (
+        'SELECT DISTINCT ON (uri) * FROM cached_files WHERE uri = ANY($1::VARCHAR[]) '
+        'AND (highest_available = $2 OR marked_as_highest_available) '
+        'AND NOT needs_refresh '
+        'ORDER BY uri, highest_available = $2 DESC'
+    )
+    GET_CACHED_FILE_BY_QUALITY = (
+        'SELECT * FROM cached_files WHERE uri = $1 '
+        'AND bit_depth IS NOT DISTINCT FROM $2 AND bitrate_kbps = $3 AND sample_rate_khz = $4 '
+        'AND NOT needs_refresh '
+        'LIMIT 1'
+    )
+    # Lets the other processes know that their in-memory copies of these uris are stale (delivered on commit)
+    NOTIFY_CACHED_FILES_CHANGED = "SELECT pg_notify('cached_files', uri) FROM unnest($1::VARCHAR[]) AS uri"
+    # Keyset pagination over the primary key, see `CacheVerifier`
+    GET_STALE_CACHED_FILES = (
+        'SELECT * FROM cached_files WHERE id > $1 '
+        'AND NOT needs_refresh AND (verified_at IS NULL OR verified_at < now() - $2::INTERVAL) '
+        'ORDER BY id LIMIT $3'
+    )
+    MARK_CACHED_FILE_VERIFIED = 'UPDATE cached_files SET verified_at = now() WHERE uri = $1 AND file_id = $2'
+    MARK_CACHED_FILE_FOR_REFRESH = 'UPDATE cached_files SET needs_refresh = TRUE WHERE uri = $1 AND file_id = $2'
+
+    # Backoff is $4 for the first failure, doubled on every consecutive one up to $5
+    STORE_DOWNLOAD_FAILURE = (
+        'INSERT INTO download_failures (uri, highest_available, reason, retry_after) '
+        'VALUES ($1, $2, $3, now() + $4::INTERVAL) '
+        'ON CONFLICT (uri, highest_available) DO UPDATE SET '
+        'reason = EXCLUDED.reason, '
+        'failures = download_failures.failures + 1, '
+        'failed_at = now(), '
+        'retry_after = now() + LEAST($4::INTERVAL * power(2, download_failures.failures), $5::INTERVAL) '
+        'RETURNING reason, failures, retry_after'
+    )
+    GET_DOWNLOAD_FAILURE = (
+        'SELECT reason, failures, retry_after FROM download_failures '
+        'WHERE uri = $1 AND highest_available = $2 AND retry_after > now() '
+        'LIMIT 1'
+    )
+    DELETE_DOWNLOAD_FAILURES = 'DELETE FROM download_failures WHERE uri = $1'
+    # Rows that are way past their backoff, the failure count is not worth keeping anymore
+    DELETE_EXPIRED_DOWNLOAD_FAILURES = 'DELETE FROM download_failures WHERE retry_after < now() - $1::INTERVAL'
+
+    STORE_SONG_LINK = (
+        'INSERT INTO cached_song_link_urls (song_url, song_link, resolved_at, ttl, is_negative) '
+        'VALUES ($1, $2::TEXT, now(), $3::INTERVAL, $2 IS NULL) '
+        'ON CONFLICT (song_url) DO UPDATE SET '
+        'song_link = EXCLUDED.song_link, '
+        'resolved_at = EXCLUDED.resolved_at, '
+        'ttl = EXCLUDED.ttl, '
+        'is_negative = EXCLUDED.is_negative'
+    )
+    GET_SONG_LINK = (
+        'SELECT song_link, is_negative FROM cached_song_link_urls '
+        'WHERE song_url = $1 AND (ttl IS NULL OR resolved_at + ttl > now()) '
+        'LIMIT 1'
+    )
+    DELETE_EXPIRED_SONG_LINKS = 'DELETE FROM cached_song_link_urls WHERE ttl IS NOT NULL AND resolved_at + ttl <= now()'
+
+    # Ids of all the tracks in the input order, existing ones are reused. Inserted rows aren't visible to the outer
+    #   select within the same statement, hence the two joins
+    CACHE_LOCAL_TRACKS = (
+        'WITH input AS ('
+        'SELECT * FROM unnest($1::VARCHAR[], $2::VARCHAR[], $3::VARCHAR[], $4::VARCHAR[]) '
+        'WITH ORDINALITY AS t (platform_name, url, artist, name, ord)'
+        '), inserted AS ('
+        'INSERT INTO local_tracks (platform_name, url, artist, name) '
+        'SELECT DISTINCT ON (platform_name, url) platform_name, url, artist, name FROM input '
+        'ORDER BY platform_name, url, ord '
+        'ON CONFLICT (platform_name, url) DO NOTHING '
+        'RETURNING id, platform_name, url'
+        ') '
+        'SELECT COALESCE(inserted.id, existing.id) AS id FROM input '
+        'LEFT JOIN inserted ON inserted.platform_name = input.platform_name AND inserted.url = input.url '
+        'LEFT JOIN local_tracks existing ON existing.platform_name = input.platform_name AND existing.url = input.url '
+        'ORDER BY input.ord'
+    )
+    GET_CACHED_LOCAL_TRACK_INFO = (
+        'SELECT (id, platform_name, url, artist, name, last_used_at) FROM local_tracks WHERE id = $1 LIMIT 1'
+    )
+    GET_ARCHIVED_LOCAL_TRACK_INFO = (
+        'SELECT (id, platform_name, url, artist, name, last_used_at) FROM local_tracks_archive WHERE id = $1 LIMIT 1'
+    )
+    TOUCH_LOCAL_TRACK = 'UPDATE local_tracks SET last_used_at = now() WHERE id = $1'
+    # Up to $2 tracks at once, rows that are being touched right now are skipped. Returns the amount of moved tracks
+    ARCHIVE_LOCAL_TRACKS = (
+        'WITH batch AS ('
+        'SELECT id FROM local_tracks WHERE last_used_at < now() - $1::INTERVAL LIMIT $2 FOR UPDATE SKIP LOCKED'
+        '), archived AS ('
+        'DELETE FROM local_tracks WHERE id IN (SELECT id FROM batch) '
+        'RETURNING id, inserted_at, last_used_at, platform_name, url, artist, name'
+        '), inserted AS ('
+        'INSERT INTO local_tracks_archive (id, inserted_at, last_used_at, platform_name, url, artist, name) '
+        'SELECT * FROM archived '
+        'ON CONFLICT (id) DO NOTHING'
+        ') '
+        'SELECT count(*) FROM archived'
+    )
+
+    GET_USER_CONFIG = 'SELECT * FROM user_configs WHERE user_id = $1 LIMIT 1'
+    GET_USER_CONTEXT = (
+        'SELECT '
+        '(SELECT row_to_json(c) FROM user_configs c WHERE c.user_id = $1) AS config, '
+        '(SELECT json_object_agg(platform_name, token) FROM tokens WHERE telegram_id = $1) AS tokens'
+    )
+    # Same tokens as above, for when the config is cached already
+    GET_USER_TOKENS = 'SELECT json_object_agg(platform_name, token) FROM tokens WHERE telegram_id = $1'
+
+    # Maintained by the triggers on cached_files, see migration 0007
+    GET_CACHED_FILES_COUNT_FOR_USER = 'SELECT cached_files_count FROM user_cache_stats WHERE user_id = $1 LIMIT 1'
+    # Rows that are being updated by someone else right now are skipped, the next run will pick them up
+    STRIP_USER_ID_FROM_CACHED_FILES = (
+        'UPDATE cached_files SET cached_by_user_id = NULL WHERE id IN ('
+        'SELECT id FROM cached_files WHERE cached_by_user_id = $1 LIMIT $2 FOR UPDATE SKIP LOCKED'
+        ')'
+    )
+    GET_USERS_TO_STRIP = (
+        'SELECT c.user_id FROM user_configs c '
+        'JOIN user_cache_stats s ON s.user_id = c.user_id '
+        'WHERE c.stats_opt_out AND s.cached_files_count > 0'
+    )
+    INCREMENT_SENT_TRACKS_COUNTS = (
+        'INSERT INTO user_track_stats (user_id, track_count) '
+        'SELECT * FROM unnest($1::BIGINT[], $2::INT[]) '
+        'ON CONFLICT (user_id) DO '
+        'UPDATE SET track_count = user_track_stats.track_count + EXCLUDED.track_count;'
+    )
+    GET_USER_SENT_TRACKS_COUNT = 'SELECT track_count FROM user_track_stats WHERE user_id = $1 LIMIT 1'
+
+    # Two-int advisory locks, see `ClusterLockManager`. Always on the primary, locks are not replicated
+    IS_ADVISORY_LOCK_HELD = (
+        'SELECT EXISTS (SELECT 1 FROM pg_locks '
+        "WHERE locktype = 'advisory' AND classid = $1::INT::OID AND objid = $2::INT::OID AND objsubid = 2)"
+    )
+
+    # Seconds since the last replayed transaction, 0 when the replica has replayed everything it has received
+    GET_REPLICA_LAG = (
+        'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+        'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+    )
@@ -0,0 +1,12 @@
+from nowplaying.core.config import config
+from nowplaying.core.database import db
+from nowplaying.util.counter_buffer import CounterBuffer
+
+
+# key is user id
+sent_tracks_stats: CounterBuffer[int] = CounterBuffer(
+    db.increment_sent_tracks_counts,
+    flush_interval_sec=config.STATS_FLUSH_INTERVAL_SEC,
+    max_events=config.STATS_FLUSH_MAX_EVENTS,
+    name='sent_tracks_stats',
+)
@@ -1,22 +1,45 @@
+from collections.abc import Awaitable, Callable
+from datetime import timedelta
+
 from aiohttp import ClientSession, ClientTimeout
-from async_lru import alru_cache
 
+from nowplaying.core.config import config
+from nowplaying.core.database import db
+from nowplaying.models.song_link import CachedSongLink
+from nowplaying.util.cache import LRUCache
 from nowplaying.util.http import get_headers
 from nowplaying.util.url import ParseResult, urlparse
 
 from .song_link_parsers import fallback_to_odesli, get_song_link_parser
 
 
-@alru_cache()
-async def get_song_link(track_url: str, *, allow_fallback: bool = True) -> str | None:
-    url: ParseResult = urlparse(track_url)
-    parser = get_song_link_parser(url.netloc)
-    if parser:
-        return parser(url)
+# Per-process layer in front of the database one, so that building a caption isn't a roundtrip every time
+SONG_LINKS: LRUCache[str, CachedSongLink] = LRUCache(
+    config.SONG_LINK_MEMORY_CACHE_SIZE, ttl_sec=config.SONG_LINK_MEMORY_CACHE_TTL_SEC
+)
+
+
+async def get_cached_song_link(track_url: str, resolver: Callable[[str], Awaitable[str | None]]) -> str | None:
+    cached = SONG_LINKS.get(track_url)
+    if cached is not None:
+        return cached.song_link
+
+    # Shared between all the processes and restarts, unresolvable tracks are remembered too (for a shorter time)
+    cached = await db.get_song_link(track_url)
+    if cached is not None:
+        SONG_LINKS.put(track_url, cached)
+        return cached.song_link
+
+    # NOTE(es3n1n): `SongLinkTemporarilyUnavailableError` is propagated as is and nothing is cached then, otherwise a
+    #   single rate limited request would've hidden the link of this track for the whole negative TTL
+    song_link = await resolver(track_url)
+    ttl_sec = config.SONG_LINK_CACHE_TTL_SEC if song_link is not None else config.SONG_LINK_NEGATIVE_CACHE_TTL_SEC
+    await db.store_song_link(track_url, song_link, ttl=timedelta(seconds=ttl_sec))
+    SONG_LINKS.put(track_url, CachedSongLink(song_link))
+    return song_link
 
-    if not allow_fallback:
-        return None
 
+async def _query_odesli(track_url: str) -> str | None:
     async with ClientSession(
         headers=get_headers(
             legitimate_headers=True,
@@ -27,3 +50,16 @@ async def get_song_link(track_url: str, *, allow_fallback: bool = True) -> str |
         timeout=ClientTimeout(total=60.0),
     ) as client:
         return await fallback_to_odesli(client, track_url)
+
+
+async def get_song_link(track_url: str, *, allow_fallback: bool = True) -> str | None:
+    # Parsers are offline, no need to cache them
+    url: ParseResult = urlparse(track_url)
+    parser = get_song_link_parser(url.netloc)
+    if parser:
+        return parser(url)
+
+    if not allow_fallback:
+        return None
+
+    return await get_cached_song_link(track_url, _query_odesli)
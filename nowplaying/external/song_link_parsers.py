@@ -3,11 +3,15 @@ from types import MappingProxyType
 from urllib.parse import ParseResult, parse_qs
 
 import orjson
-from aiohttp import ClientSession
+from aiohttp import ClientError, ClientSession
 
 from nowplaying.bot.reporter import report_error
 from nowplaying.enums.resolved_platform_type import ResolvedPlatformType
-from nowplaying.util.http import STATUS_OK
+from nowplaying.util.http import STATUS_OK, STATUS_TOO_MANY_REQUESTS, is_serverside_error
+
+
+class SongLinkTemporarilyUnavailableError(Exception):
+    """Odesli is rate limiting us or is down, unlike a `None` link this doesn't mean that the track has no match."""
 
 
 # source: https://odesli.co/_next/static/chunks/pages/index-5b40c5e4b10da55d.js
@@ -81,7 +85,14 @@ async def fallback_to_odesli(client: ClientSession, track_url: str, *, ignore_re
     if not ignore_reporting:
         await report_error(f'Falling back to Odesli API for the URL: {track_url}')
 
-    response = await client.get('https://api.odesli.co/resolve', params={'url': track_url})
+    try:
+        response = await client.get('https://api.odesli.co/resolve', params={'url': track_url})
+    except (ClientError, TimeoutError) as err:
+        raise SongLinkTemporarilyUnavailableError(track_url) from err
+
+    if response.status == STATUS_TOO_MANY_REQUESTS or is_serverside_error(response.status):
+        msg = f'{track_url}: status {response.status}'
+        raise SongLinkTemporarilyUnavailableError(msg)
 
     if response.status != STATUS_OK:
         return None
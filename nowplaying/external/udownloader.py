@@ -1,11 +1,15 @@
-from asyncio import sleep
+from asyncio import sleep, to_thread
 from dataclasses import dataclass
 from functools import cache
+from pathlib import Path
+from shutil import rmtree
+from tempfile import SpooledTemporaryFile
 from time import perf_counter
 from typing import TypedDict
+from uuid import uuid4
 
 import orjson
-from aiohttp import ClientError, ClientSession
+from aiohttp import ClientError, ClientResponse, ClientSession
 from loguru import logger
 
 from nowplaying.core.config import config
@@ -15,8 +19,8 @@ from nowplaying.util.http import STATUS_OK, get_headers
 
 class SongQualityInfo(TypedDict):
     bit_depth: int | None
-    bitrate_kbps: int
-    sample_rate_khz: int
+    bitrate_kbps: int | float
+    sample_rate_khz: int | float
     highest_available: bool
 
 
@@ -28,10 +32,18 @@ class DownloadedSong:
     quality: SongQualityInfo
     duration_sec: int
 
-    data: bytes
+    # Either stays in memory while small and rolled over to disk otherwise, or is staged on the disk in a directory of
+    #   its own (see `staging_dir`). Owned by the caller, see `close`
+    data: SpooledTemporaryFile[bytes] | Path
 
     platform_name: str = 'UNKNOWN'
 
+    def close(self) -> None:
+        if isinstance(self.data, Path):
+            rmtree(self.data.parent, ignore_errors=True)
+            return
+        self.data.close()
+
 
 class UdownloaderError(Exception):
     """Base class for all udownloader exceptions."""
@@ -49,7 +61,43 @@ def get_udownloader_base() -> str:
     return select_url(config.UDOWNLOADER_DOCKER_BASE_URL, config.UDOWNLOADER_BASE_URL)
 
 
-async def _download_by_songlink(body: dict[str, str | bool]) -> DownloadedSong:
+async def _spool(response: ClientResponse) -> SpooledTemporaryFile[bytes]:
+    # NOTE(es3n1n): Hi-res flacs could be hundreds of megabytes, so instead of reading the whole body into memory it's
+    #   written chunk by chunk into a file that only spills to disk once it's larger than the threshold. Writes are
+    #   done in a thread, once it's on the disk they would've been blocking the event loop otherwise
+    data = SpooledTemporaryFile(max_size=config.UDOWNLOADER_SPOOL_MAX_MEMORY_BYTES)
+    try:
+        async for chunk in response.content.iter_chunked(config.UDOWNLOADER_CHUNK_SIZE):
+            await to_thread(data.write, chunk)
+    except BaseException:
+        data.close()
+        raise
+
+    data.seek(0)
+    return data
+
+
+async def _stage(response: ClientResponse, staging_dir: Path) -> Path:
+    # Every download gets a directory of its own, so that the file could be renamed freely afterwards
+    directory = staging_dir / uuid4().hex
+    directory.mkdir(parents=True)
+    path = directory / 'download'
+    try:
+        # Disk writes are done in a thread, same as in `_spool`
+        f = await to_thread(path.open, 'wb')
+        try:
+            async for chunk in response.content.iter_chunked(config.UDOWNLOADER_CHUNK_SIZE):
+                await to_thread(f.write, chunk)
+        finally:
+            await to_thread(f.close)
+    except BaseException:
+        rmtree(directory, ignore_errors=True)
+        raise
+
+    return path
+
+
+async def _download_by_songlink(body: dict[str, str | bool], staging_dir: Path | None) -> DownloadedSong:
     start_time = perf_counter()
     async with ClientSession(headers=get_headers()) as session:
         try:
@@ -72,7 +120,7 @@ async def _download_by_songlink(body: dict[str, str | bool]) -> DownloadedSong:
                 duration_sec = int(response.headers['x-duration-seconds'])
                 quality_json = orjson.loads(response.headers['x-file-quality'])
                 platform_name = response.headers['x-downloaded-from']
-                data = await response.read()
+                data = await _spool(response) if staging_dir is None else await _stage(response, staging_dir)
         except (ClientError, TimeoutError, OSError, orjson.JSONDecodeError) as err:
             err_msg = 'udownloader is unavailable'
             raise UdownloaderNetworkError(err_msg) from err
@@ -89,7 +137,9 @@ async def _download_by_songlink(body: dict[str, str | bool]) -> DownloadedSong:
     )
 
 
-async def download(song_link_url: str, *, download_flac: bool, fast_route: bool) -> DownloadedSong:
+async def download(
+    song_link_url: str, *, download_flac: bool, fast_route: bool, staging_dir: Path | None = None
+) -> DownloadedSong:
     last_exception: UdownloaderNetworkError | None = None
 
     for i in range(config.UDOWNLOADER_RETRIES):
@@ -99,7 +149,8 @@ async def download(song_link_url: str, *, download_flac: bool, fast_route: bool)
                     'url': song_link_url,
                     'download_flac': download_flac,
                     'skip_song_link': fast_route,
-                }
+                },
+                staging_dir,
             )
         except UdownloaderNetworkError as err:
             # Retry only on network errors
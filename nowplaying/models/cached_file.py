@@ -1,13 +1,33 @@
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, NamedTuple
+
 import orjson
 from pydantic import BaseModel, field_validator
 
 from nowplaying.external.udownloader import SongQualityInfo
 
 
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+    from asyncpg import Record
+
+
+class CachedFileRow(NamedTuple):
+    """A `cached_files` row for bulk ingestion, fields are in the COPY columns order."""
+
+    uri: str
+    file_id: str
+    cached_by_user_id: int | None
+    quality_info: SongQualityInfo
+
+
 class CachedFile(BaseModel):
     file_id: str
     cached_by_user_id: int | None
     quality_info: SongQualityInfo
+    # When the file id was confirmed to be alive last time, `None` if never
+    verified_at: datetime | None = None
 
     @field_validator('quality_info', mode='before')
     @classmethod
@@ -19,3 +39,22 @@ class CachedFile(BaseModel):
                 err_msg = f'Invalid JSON for quality_info: {e}'
                 raise ValueError(err_msg) from e
         return value
+
+    @classmethod
+    def from_record(cls, record: 'Record | Mapping[str, Any]') -> 'CachedFile':
+        # NOTE(es3n1n): jsonb is already decoded by the pool codecs, and kwargs init is cheaper than both
+        # model_validate(dict(record)) and model_construct (which runs in python on pydantic v2)
+        return cls(
+            file_id=record['file_id'],
+            cached_by_user_id=record['cached_by_user_id'],
+            quality_info=record['quality_info'],
+            verified_at=record.get('verified_at'),
+        )
+
+
+class StaleCachedFile(NamedTuple):
+    """A `cached_files` row that is due for the verification, see `Database.get_stale_cached_files`."""
+
+    id: int
+    uri: str
+    file: CachedFile
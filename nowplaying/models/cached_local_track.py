@@ -1,3 +1,5 @@
+from typing import NamedTuple
+
 from pydantic import BaseModel
 
 from nowplaying.enums.platform_type import SongLinkPlatformType
@@ -9,3 +11,12 @@ class CachedLocalTrack(BaseModel):
     url: str
     artist: str
     name: str
+
+
+class LocalTrackRow(NamedTuple):
+    """A track that should get a local id, see `Database.cache_local_tracks`."""
+
+    platform_type: SongLinkPlatformType
+    url: str
+    artist: str
+    name: str
@@ -0,0 +1,10 @@
+from datetime import datetime
+from typing import NamedTuple
+
+
+class DownloadFailure(NamedTuple):
+    """A track that shouldn't be downloaded again until `retry_after`, see `Database.store_download_failure`."""
+
+    reason: str
+    failures: int
+    retry_after: datetime
@@ -1,3 +1,5 @@
+from typing import NamedTuple
+
 from pydantic import BaseModel
 
 from nowplaying.enums.platform_type import SongLinkPlatformType
@@ -11,3 +13,13 @@ class SongLinkPlatform(BaseModel):
 class SongLinkInfo(BaseModel):
     platforms: dict[SongLinkPlatformType, SongLinkPlatform] = {}
     thumbnail_url: str = ''
+
+
+class CachedSongLink(NamedTuple):
+    """Song link cache entry, `None` link means that the track couldn't be resolved (a negative entry)."""
+
+    song_link: str | None
+
+    @property
+    def is_negative(self) -> bool:
+        return self.song_link is None
@@ -3,11 +3,10 @@ from datetime import datetime
 from pydantic import BaseModel
 from yandex_music import Track as YandexTrack
 
-from nowplaying.core.database import db
 from nowplaying.external.apple import AppleMusicTrack
 from nowplaying.external.lastfm import LastFMTrack, query_last_fm_song_link
-from nowplaying.external.song_link import get_song_link
-from nowplaying.external.song_link_parsers import get_sc_link_from_id
+from nowplaying.external.song_link import get_cached_song_link, get_song_link
+from nowplaying.external.song_link_parsers import SongLinkTemporarilyUnavailableError, get_sc_link_from_id
 from nowplaying.external.soundcloud import SoundCloudTrack
 from nowplaying.util.time import TS_NULL
 
@@ -42,37 +41,25 @@ class Track(BaseModel):
     def is_available(self) -> bool:
         return self.id is not None
 
-    @property
-    def _should_cache_song_link(self) -> bool:
-        # We are only caching song links that are not trivial to obtain.
-        # Most of the platforms do not require any special handling,
-        #   and usually it's a matter of a few urls parsing methods.
-        # But when we are dealing with LastFM, we need to do a lot of networking,
-        #   and we don't want to do it every time.
-        return self.platform == SongLinkPlatformType.LASTFM
-
     async def _query_song_link(self) -> str | None:
-        if self.platform == SongLinkPlatformType.LASTFM:
-            return await query_last_fm_song_link(self.url)
-        return await get_song_link(self.url)
+        try:
+            if self.platform == SongLinkPlatformType.LASTFM:
+                # Lots of networking for LastFM, so its results are cached too
+                return await get_cached_song_link(self.url, query_last_fm_song_link)
+            return await get_song_link(self.url)
+        except SongLinkTemporarilyUnavailableError:
+            # Same as no link for now, but it's not remembered anywhere so we'll try again next time
+            return None
 
     async def song_link(self) -> str | None:
         # Predefined
         if not self._song_link and self.song_link_raw_value:
             self._song_link = self.song_link_raw_value
 
-        # Query from DB, if possible.
-        # Do not do DB queries if we aren't storing links for this platform though.
-        if not self._song_link and self._should_cache_song_link:
-            self._song_link = await db.get_song_link(self.url)
-
-        # Generate new
+        # Generate new, or get it from the cache
         if not self._song_link:
             self._song_link = await self._query_song_link()
 
-            if self._song_link and self._should_cache_song_link:
-                await db.store_song_link(self.url, self._song_link)
-
         return self._song_link
 
     @classmethod
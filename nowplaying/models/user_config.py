@@ -1,8 +1,14 @@
-from typing import Annotated
+from typing import TYPE_CHECKING, Annotated, Any
 
 from pydantic import BaseModel, ConfigDict, Field
 
 
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+    from asyncpg import Record
+
+
 # NOTE(es3n1n): Do not forget to update `user_configs` table in the database
 class UserConfig(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -17,6 +23,11 @@ class UserConfig(BaseModel):
     download_flac: Annotated[bool, Field(description='Download in lossless quality if possible')] = True
     fast_download_route: Annotated[bool, Field(description='Fast downloading route (lower quality)')] = False
 
+    @classmethod
+    def from_record(cls, record: 'Record | Mapping[str, Any]') -> 'UserConfig':
+        # NULLs are falling back to the defaults, unknown columns (e.g. user_id) are ignored by pydantic
+        return cls.model_validate({name: value for name, value in record.items() if value is not None})
+
     def text(self, text: str) -> str:
         if self.lowercase_mode:
             text = text.lower()
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+
+from nowplaying.enums.platform_type import SongLinkPlatformType
+
+from .user_config import UserConfig
+
+
+# Everything that handlers need to know about the user, loaded within a single query
+class UserContext(BaseModel):
+    telegram_id: int
+    user_config: UserConfig
+    tokens: dict[SongLinkPlatformType, str] = {}
+
+    @property
+    def is_authorized_globally(self) -> bool:
+        return bool(self.tokens)
+
+    @property
+    def authorized_platforms(self) -> list[SongLinkPlatformType]:
+        return list(self.tokens.keys())
+
+    def is_authorized(self, platform: SongLinkPlatformType) -> bool:
+        return platform in self.tokens
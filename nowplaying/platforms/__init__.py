@@ -1,5 +1,6 @@
 from nowplaying.models.song_link import SongLinkPlatformType
 from nowplaying.models.track import Track
+from nowplaying.models.user_context import UserContext
 
 from .abc import PlatformABC, PlatformClientABC
 from .apple import ApplePlatform
@@ -24,12 +25,16 @@ platforms: list[PlatformABC] = [
 ]
 
 
-async def get_platform_from_telegram_id(telegram_id: int, platform_type: SongLinkPlatformType) -> PlatformClientABC:
+async def get_platform_from_telegram_id(
+    telegram_id: int,
+    platform_type: SongLinkPlatformType,
+    context: UserContext | None = None,
+) -> PlatformClientABC:
     for platform in platforms:
         if platform.type != platform_type:
             continue
 
-        return await platform.from_telegram_id(telegram_id)
+        return await platform.from_telegram_id(telegram_id, context)
 
     msg = 'Unsupported platform'
     raise ValueError(msg)
@@ -39,6 +44,7 @@ async def get_platform_track(
     track_id: str,
     telegram_id: int,
     platform_type: SongLinkPlatformType,
+    context: UserContext | None = None,
 ) -> tuple[PlatformClientABC, Track | None]:
-    platform = await get_platform_from_telegram_id(telegram_id, platform_type)
+    platform = await get_platform_from_telegram_id(telegram_id, platform_type, context)
     return platform, await platform.get_track(track_id)
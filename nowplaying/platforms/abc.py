@@ -2,9 +2,11 @@ from abc import ABC, abstractmethod
 from collections.abc import AsyncIterator
 from types import MappingProxyType
 
+from nowplaying.core.database import db
 from nowplaying.enums.platform_features import PlatformFeature
 from nowplaying.models.song_link import SongLinkPlatformType
 from nowplaying.models.track import Track
+from nowplaying.models.user_context import UserContext
 
 
 # Will be thrown to signalize that something is wrong on the client side:
@@ -66,9 +68,16 @@ class PlatformABC(ABC):
         """ """
 
     @abstractmethod
-    async def from_telegram_id(self, telegram_id: int) -> PlatformClientABC:
+    async def from_telegram_id(self, telegram_id: int, context: UserContext | None = None) -> PlatformClientABC:
         """ """
 
     @abstractmethod
     async def get_authorization_url(self, state: str) -> str:
         """ """
+
+    @classmethod
+    async def get_token(cls, telegram_id: int, context: UserContext | None = None) -> str | None:
+        # Prefer the preloaded context, if there is one
+        if context is not None and context.telegram_id == telegram_id:
+            return context.tokens.get(cls.type)
+        return await db.get_user_token(telegram_id, cls.type)
@@ -10,6 +10,7 @@ from nowplaying.exceptions.platforms import PlatformInvalidAuthCodeError
 from nowplaying.external.apple import AppleMusicError, AppleMusicWrapper, AppleMusicWrapperClient
 from nowplaying.models.song_link import SongLinkPlatformType
 from nowplaying.models.track import Track
+from nowplaying.models.user_context import UserContext
 from nowplaying.platforms.abc import PlatformABC, PlatformClientABC
 from nowplaying.util.exceptions import rethrow_platform_error
 from nowplaying.util.logger import logger
@@ -90,8 +91,8 @@ class ApplePlatform(PlatformABC):
         await db.store_user_token(telegram_id, TYPE, auth_code)
         return client
 
-    async def from_telegram_id(self, telegram_id: int) -> PlatformClientABC:
-        token = await db.get_user_token(telegram_id, TYPE)
+    async def from_telegram_id(self, telegram_id: int, context: UserContext | None = None) -> PlatformClientABC:
+        token = await self.get_token(telegram_id, context)
         if token is None:
             msg = 'token is none'
             raise ValueError(msg)
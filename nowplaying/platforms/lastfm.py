@@ -1,5 +1,4 @@
 from collections.abc import AsyncIterator
-from datetime import datetime
 from types import MappingProxyType
 from typing import TYPE_CHECKING
 from urllib.parse import urlencode
@@ -9,10 +8,11 @@ from nowplaying.core.database import db
 from nowplaying.enums.platform_features import PlatformFeature
 from nowplaying.exceptions.platforms import PlatformInvalidAuthCodeError
 from nowplaying.external.lastfm import LastFMClient, LastFMError, LastFMTrack
+from nowplaying.models.cached_local_track import LocalTrackRow
 from nowplaying.models.song_link import SongLinkPlatformType
 from nowplaying.models.track import Track
+from nowplaying.models.user_context import UserContext
 from nowplaying.util.exceptions import rethrow_platform_error
-from nowplaying.util.time import TS_NULL
 
 from .abc import PlatformABC, PlatformClientABC
 
@@ -42,12 +42,19 @@ class LastfmClient(PlatformClientABC):
     @rethrow_platform_error(LastFMError, TYPE)
     async def get_current_and_recent_tracks(self, limit: int) -> AsyncIterator[Track]:
         # Limit is without the currently playing track, no need to do +1
-        for track in await self.net.get_recent_tracks(limit=limit):
-            yield await self._parse_track(
-                track.track,
+        tracks = [
+            await Track.from_lastfm_item(
+                track=track.track,
+                track_id=None,
                 played_at=track.playback_date,
                 is_playing=track.is_now_playing,
             )
+            for track in await self.net.get_recent_tracks(limit=limit)
+        ]
+        await self._assign_local_ids(tracks)
+
+        for track in tracks:
+            yield track
 
     @rethrow_platform_error(LastFMError, TYPE)
     async def get_track(self, track_id: str) -> Track | None:
@@ -55,13 +62,16 @@ class LastfmClient(PlatformClientABC):
         if cached_track is None:
             return None
 
-        return await self._parse_track(
-            LastFMTrack(
+        track = await Track.from_lastfm_item(
+            track=LastFMTrack(
                 url=cached_track.url,
                 artist=cached_track.artist,
                 name=cached_track.name,
-            )
+            ),
+            track_id=None,
         )
+        await self._assign_local_ids([track])
+        return track
 
     async def add_to_queue(self, _: str) -> None:
         raise NotImplementedError
@@ -72,31 +82,15 @@ class LastfmClient(PlatformClientABC):
     async def like(self, _: str) -> None:
         raise NotImplementedError
 
-    @classmethod
-    async def _parse_track(
-        cls,
-        track: LastFMTrack,
-        played_at: datetime = TS_NULL,
-        *,
-        is_playing: bool = False,
-    ) -> Track:
-        out_track = await Track.from_lastfm_item(
-            track=track,
-            track_id=None,
-            played_at=played_at,
-            is_playing=is_playing,
+    @staticmethod
+    async def _assign_local_ids(tracks: list[Track]) -> None:
+        # Tracks without a song link aren't available for a download, so they are left without an id
+        available = [track for track in tracks if await track.song_link() is not None]
+        track_ids = await db.cache_local_tracks(
+            [LocalTrackRow(TYPE, track.url, track.artist, track.name) for track in available]
         )
-
-        song_link = await out_track.song_link()
-        if song_link is not None:  # otherwise, this track isn't available for a download
-            out_track.id = await db.cache_local_track(
-                platform=TYPE,
-                url=out_track.url,
-                artist=out_track.artist,
-                name=out_track.name,
-            )
-
-        return out_track
+        for track, track_id in zip(available, track_ids, strict=True):
+            track.id = track_id
 
 
 class LastfmPlatform(PlatformABC):
@@ -114,8 +108,8 @@ class LastfmPlatform(PlatformABC):
         return LastfmClient(LastFMClient(session_key), telegram_id)
 
     @classmethod
-    async def from_telegram_id(cls, telegram_id: int) -> PlatformClientABC:
-        session_key = await db.get_user_token(telegram_id, cls.type)
+    async def from_telegram_id(cls, telegram_id: int, context: UserContext | None = None) -> PlatformClientABC:
+        session_key = await cls.get_token(telegram_id, context)
         if session_key is None:
             msg = 'session is None'
             raise ValueError(msg)
@@ -9,6 +9,7 @@ from nowplaying.enums.platform_type import SongLinkPlatformType
 from nowplaying.exceptions.platforms import PlatformInvalidAuthCodeError
 from nowplaying.external.soundcloud import SoundCloudError, SoundCloudWrapper
 from nowplaying.models.track import Track
+from nowplaying.models.user_context import UserContext
 from nowplaying.platforms import PlatformABC, PlatformClientABC
 from nowplaying.util.exceptions import rethrow_platform_error
 from nowplaying.util.time import UTC_TZ
@@ -74,8 +75,8 @@ class SoundCloudPlatform(PlatformABC):
         return SoundCloudClient(wrapper, telegram_id)
 
     @classmethod
-    async def from_telegram_id(cls, telegram_id: int) -> PlatformClientABC:
-        oauth_token = await db.get_user_token(telegram_id, cls.type)
+    async def from_telegram_id(cls, telegram_id: int, context: UserContext | None = None) -> PlatformClientABC:
+        oauth_token = await cls.get_token(telegram_id, context)
         if oauth_token is None:
             msg = 'oauth_token is None'
             raise ValueError(msg)
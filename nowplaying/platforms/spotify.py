@@ -21,6 +21,7 @@ from nowplaying.external.spotify import (
 )
 from nowplaying.models.song_link import SongLinkPlatformType
 from nowplaying.models.track import Track
+from nowplaying.models.user_context import UserContext
 from nowplaying.platforms.abc import PlatformABC, PlatformClientABC, PlatformClientSideError
 from nowplaying.util.exceptions import rethrow_platform_error
 from nowplaying.util.time import UTC_TZ
@@ -119,16 +120,20 @@ class SpotifyClient(PlatformClientABC):
 
 
 class SpotifyCacheHandler(SpotifyCacheHandlerABC):
-    def __init__(self, telegram_id: int) -> None:
+    def __init__(self, telegram_id: int, token: str | None = None) -> None:
         self.telegram_id = telegram_id
+        # Preloaded token, if any
+        self.token = token
 
     async def get_cached_token(self) -> dict | None:
-        cached_token = await db.get_user_token(self.telegram_id, TYPE)
-        return orjson.loads(cached_token) if cached_token is not None else None
+        if self.token is None:
+            self.token = await db.get_user_token(self.telegram_id, TYPE)
+        return orjson.loads(self.token) if self.token is not None else None
 
     async def save_token_to_cache(self, token_info: dict) -> None:
         token_info_str = orjson.dumps(token_info).decode()
         await db.store_user_token(self.telegram_id, TYPE, token_info_str)
+        self.token = token_info_str
 
 
 class SpotifyPlatform(PlatformABC):
@@ -145,8 +150,9 @@ class SpotifyPlatform(PlatformABC):
         return SpotifyClient(client, telegram_id)
 
     @classmethod
-    async def from_telegram_id(cls, telegram_id: int) -> PlatformClientABC:
-        client = cls._get_client(telegram_id)
+    async def from_telegram_id(cls, telegram_id: int, context: UserContext | None = None) -> PlatformClientABC:
+        token = context.tokens.get(TYPE) if context is not None and context.telegram_id == telegram_id else None
+        client = cls._get_client(telegram_id, token)
         try:
             await client.gather_token()
         except SpotifyError as err:
@@ -167,11 +173,11 @@ class SpotifyPlatform(PlatformABC):
         return f'https://accounts.spotify.com/authorize?{query}'
 
     @classmethod
-    def _get_client(cls, telegram_id: int) -> Spotify:
+    def _get_client(cls, telegram_id: int, token: str | None = None) -> Spotify:
         return Spotify(
             client_id=config.SPOTIFY_CLIENT_ID,
             client_secret=config.SPOTIFY_SECRET,
             redirect_uri=REDIRECT_URI,
             scope=SCOPE,
-            cache_handler=SpotifyCacheHandler(telegram_id),
+            cache_handler=SpotifyCacheHandler(telegram_id, token),
         )
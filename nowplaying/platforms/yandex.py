@@ -12,6 +12,7 @@ from nowplaying.external.yandex import ClientAsync
 from nowplaying.external.ynison.ynison_grpc import Ynison, YnisonClientSideError, YnisonError
 from nowplaying.models.song_link import SongLinkPlatformType
 from nowplaying.models.track import Track
+from nowplaying.models.user_context import UserContext
 from nowplaying.platforms.abc import PlatformABC, PlatformClientABC, PlatformClientSideError
 from nowplaying.util.exceptions import rethrow_platform_error
 from nowplaying.util.time import UTC_TZ
@@ -115,8 +116,8 @@ class YandexPlatform(PlatformABC):
         await db.store_user_token(telegram_id, self.type, auth_code)
         return YandexClient(client, telegram_id)
 
-    async def from_telegram_id(self, telegram_id: int) -> PlatformClientABC:
-        token = await db.get_user_token(telegram_id, self.type)
+    async def from_telegram_id(self, telegram_id: int, context: UserContext | None = None) -> PlatformClientABC:
+        token = await self.get_token(telegram_id, context)
         if token is None:
             err_msg = 'token is none'
             raise ValueError(err_msg)
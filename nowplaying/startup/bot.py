@@ -2,7 +2,13 @@ from aiogram.types import BotCommand
 
 from nowplaying.bot import import_bot_handlers
 from nowplaying.bot.bot import bot, dp
+from nowplaying.bot.cache_verifier import cache_verifier
+from nowplaying.bot.caching import DOWNLOADING_LOCKS, log_cache_stats
+from nowplaying.bot.prefetch import prefetcher
+from nowplaying.bot.thumbnails import thumbnails
 from nowplaying.core.database import db
+from nowplaying.core.jobs import start_jobs, stop_jobs
+from nowplaying.core.stats import sent_tracks_stats
 from nowplaying.util.logger import logger
 
 
@@ -19,6 +25,19 @@ async def async_start_bot() -> None:
 
     logger.info('Starting long polling')
     dp.startup.register(db.init)
+    dp.startup.register(sent_tracks_stats.start)
+    dp.startup.register(start_jobs)
+    dp.startup.register(cache_verifier.start)
+    dp.startup.register(thumbnails.start)
+    # Order matters, stats should be drained before the pool is closed
+    dp.shutdown.register(prefetcher.stop)
+    dp.shutdown.register(DOWNLOADING_LOCKS.close)
+    dp.shutdown.register(cache_verifier.stop)
+    dp.shutdown.register(log_cache_stats)
+    dp.shutdown.register(thumbnails.stop)
+    dp.shutdown.register(stop_jobs)
+    dp.shutdown.register(sent_tracks_stats.stop)
+    dp.shutdown.register(db.close)
     await bot.delete_webhook(drop_pending_updates=True)
     await dp.start_polling(bot)
 
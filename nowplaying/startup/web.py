@@ -10,6 +10,7 @@ from uvicorn import run
 from nowplaying.bot.handlers.exceptions import send_auth_code_error_msg
 from nowplaying.core.config import config
 from nowplaying.core.database import db
+from nowplaying.core.jobs import start_jobs, stop_jobs
 from nowplaying.core.sign import SIGN_EXPIRED_EXCEPTION
 from nowplaying.enums.start_actions import StartAction
 from nowplaying.exceptions.platforms import PlatformInvalidAuthCodeError
@@ -74,6 +75,13 @@ async def http_exception_handler(_: Request, exc: HTTPException) -> ORJSONRespon
 @app.on_event('startup')
 async def startup() -> None:
     await db.init()
+    await start_jobs()
+
+
+@app.on_event('shutdown')
+async def shutdown() -> None:
+    await stop_jobs()
+    await db.close()
 
 
 def start_web() -> None:
@@ -0,0 +1,74 @@
+from collections import OrderedDict
+from collections.abc import Hashable
+from time import monotonic
+from typing import Generic, TypeVar
+
+
+KeyTy = TypeVar('KeyTy', bound=Hashable)
+ValueTy = TypeVar('ValueTy')
+
+
+class LRUCache(Generic[KeyTy, ValueTy]):
+    def __init__(self, max_size: int, ttl_sec: float | None = None) -> None:
+        self.max_size = max_size
+        # Items are expiring N seconds after they were put, if set
+        self.ttl_sec = ttl_sec
+        self._items: OrderedDict[KeyTy, ValueTy] = OrderedDict()
+        self._expires_at: dict[KeyTy, float] = {}
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self) -> int:
+        """Amount of cached items."""
+        return len(self._items)
+
+    def __contains__(self, key: KeyTy) -> bool:
+        """Check whether the key is cached, without affecting the stats/order."""
+        return key in self._items and not self._is_expired(key)
+
+    def _is_expired(self, key: KeyTy) -> bool:
+        expires_at = self._expires_at.get(key)
+        return expires_at is not None and monotonic() >= expires_at
+
+    def get(self, key: KeyTy) -> ValueTy | None:
+        if key in self._items and self._is_expired(key):
+            self.pop(key)
+
+        if key not in self._items:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def put(self, key: KeyTy, value: ValueTy) -> None:
+        if self.max_size <= 0:
+            return
+
+        self._items[key] = value
+        self._items.move_to_end(key)
+        if self.ttl_sec is not None:
+            self._expires_at[key] = monotonic() + self.ttl_sec
+
+        while len(self._items) > self.max_size:
+            evicted, _ = self._items.popitem(last=False)
+            self._expires_at.pop(evicted, None)
+
+    def pop(self, key: KeyTy) -> ValueTy | None:
+        self._expires_at.pop(key, None)
+        return self._items.pop(key, None)
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._expires_at.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def stats(self) -> str:
+        return f'{len(self)}/{self.max_size} items, {self.hits} hits, {self.misses} misses ({self.hit_rate:.1%})'
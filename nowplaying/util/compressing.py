@@ -6,33 +6,57 @@ from PIL import Image
 TGT_FORMAT = 'JPEG'
 TGT_MODE = 'RGB'
 
+# Pillow's docs advise against going above 95, the size grows a lot with barely any difference in quality
+MAX_QUALITY = 95
+MIN_QUALITY = 1
+
+
+def _encode(img: Image.Image, quality: int) -> io.BytesIO:
+    output_buffer = io.BytesIO()
+    img.save(output_buffer, format=TGT_FORMAT, quality=quality)
+    return output_buffer
+
+
+def _fits(buffer: io.BytesIO, target_size_kb: int) -> bool:
+    return buffer.getbuffer().nbytes / 1024 <= target_size_kb
+
 
 # Telegram has a file size limit for song covers.
-def compress_to_jpeg(img_data: io.BytesIO, target_size_kb: int, quality_step: int = 5) -> io.BytesIO:
+def compress_to_jpeg(img_data: io.BytesIO, target_size_kb: int, max_edge: int | None = None) -> io.BytesIO:
     img: Image.ImageFile.ImageFile | Image.Image = Image.open(img_data)
 
     valid_format = img.format == TGT_FORMAT
     valid_mode = img.mode == TGT_MODE
-    valid_options = valid_format and valid_mode
+    valid_size = max_edge is None or max(img.size) <= max_edge
 
-    if valid_options and img_data.getbuffer().nbytes / 1024 <= target_size_kb:
+    if valid_format and valid_mode and valid_size and _fits(img_data, target_size_kb):
         return img_data
 
-    quality = 100
-    if valid_options:
-        quality -= quality_step
+    if max_edge is not None and not valid_size:
+        # NOTE(es3n1n): For jpegs the decoder can downscale by up to 8x while decoding, which is way cheaper than
+        #   decoding the whole thing and resizing it afterwards. The draft is never smaller than the requested size
+        if valid_format:
+            img.draft(TGT_MODE, (max_edge, max_edge))
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
 
-    if not valid_mode:
+    if img.mode != TGT_MODE:
         img = img.convert(TGT_MODE)
 
-    while quality > 0:
-        output_buffer = io.BytesIO()
-        img.save(output_buffer, format=TGT_FORMAT, quality=quality)
-
-        size_kb = output_buffer.getbuffer().nbytes / 1024
-        if size_kb <= target_size_kb:
-            return output_buffer
-
-        quality -= quality_step
-
-    return img_data
+    # Downscaled covers usually fit at the max quality right away
+    best = _encode(img, MAX_QUALITY)
+    if _fits(best, target_size_kb):
+        return best
+
+    # Binary search for the highest quality that fits, the size is monotonic in quality (well, close enough)
+    result: io.BytesIO | None = None
+    low, high = MIN_QUALITY, MAX_QUALITY - 1
+    while low <= high:
+        quality = (low + high) // 2
+        output_buffer = _encode(img, quality)
+        if _fits(output_buffer, target_size_kb):
+            result = output_buffer
+            low = quality + 1
+        else:
+            high = quality - 1
+
+    return result if result is not None else img_data
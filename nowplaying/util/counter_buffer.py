@@ -0,0 +1,79 @@
+from asyncio import Lock, Task, create_task, gather, shield
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Generic, TypeVar
+
+from nowplaying.util.logger import logger
+from nowplaying.util.periodic import PeriodicTask
+
+
+KeyTy = TypeVar('KeyTy', bound=Hashable)
+
+
+class CounterBuffer(Generic[KeyTy]):
+    """Aggregates counter increments in memory and writes them behind, every N seconds or M events."""
+
+    def __init__(
+        self,
+        flush_callback: Callable[[dict[KeyTy, int]], Awaitable[None]],
+        *,
+        flush_interval_sec: float,
+        max_events: int,
+        name: str = 'counter_buffer',
+    ) -> None:
+        self.flush_callback = flush_callback
+        self.max_events = max_events
+        self.name = name
+
+        self._counts: dict[KeyTy, int] = {}
+        self._events: int = 0
+        self._flush_lock = Lock()
+        self._flush_tasks: set[Task] = set()
+        self._periodic = PeriodicTask(self._periodic_flush, flush_interval_sec, name=name)
+
+    def increment(self, key: KeyTy, amount: int = 1) -> None:
+        self._counts[key] = self._counts.get(key, 0) + amount
+        self._events += amount
+
+        if self._events >= self.max_events:
+            self._events = 0
+            self._schedule_flush()
+
+    def _schedule_flush(self) -> Task:
+        task = create_task(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+        return task
+
+    async def _periodic_flush(self) -> None:
+        # Shielded, so that stopping the periodic task never cuts off a flush halfway. `stop` waits for it instead
+        await shield(self._schedule_flush())
+
+    def pending(self, key: KeyTy) -> int:
+        return self._counts.get(key, 0)
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._counts:
+                return
+
+            batch, self._counts = self._counts, {}
+            self._events = 0
+
+            try:
+                await self.flush_callback(batch)
+            except BaseException as err:
+                # Put everything back, we will try again on the next flush (cancelled ones included)
+                for key, amount in batch.items():
+                    self._counts[key] = self._counts.get(key, 0) + amount
+                if not isinstance(err, Exception):
+                    raise
+                logger.opt(exception=err).error(f'Unable to flush {self.name} ({len(batch)} keys)')
+
+    async def start(self) -> None:
+        self._periodic.start()
+
+    async def stop(self) -> None:
+        """Stop the periodic flushes, wait for the in-flight ones and drain whatever is left."""
+        await self._periodic.stop()
+        await gather(*self._flush_tasks, return_exceptions=True)
+        await self.flush()
@@ -7,6 +7,7 @@ STATUS_TEMPORARY_REDIRECT: int = 307
 STATUS_BAD_REQUEST: int = 400
 STATUS_FORBIDDEN: int = 403
 STATUS_NOT_FOUND: int = 404
+STATUS_TOO_MANY_REQUESTS: int = 429
 
 STATUS_CLIENTSIDE_MIN: int = 400
 STATUS_CLIENTSIDE_MAX: int = 499
@@ -0,0 +1,44 @@
+from asyncio import CancelledError, Task, create_task, sleep
+from collections.abc import Callable, Coroutine
+from contextlib import suppress
+from contextvars import Context
+from typing import Any
+
+from nowplaying.util.logger import logger
+
+
+class PeriodicTask:
+    def __init__(self, callback: Callable[[], Coroutine[Any, Any, None]], interval_sec: float, name: str) -> None:
+        self.callback = callback
+        self.interval_sec = interval_sec
+        self.name = name
+        self._task: Task | None = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.is_running:
+            return
+        self._task = create_task(self._run(), name=self.name)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        task, self._task = self._task, None
+        task.cancel()
+        with suppress(CancelledError):
+            await task
+
+    async def _run(self) -> None:
+        while True:
+            await sleep(self.interval_sec)
+            try:
+                # Every iteration is a unit of work of its own, nothing set by the previous ones should leak into it
+                #   (e.g. the read-your-writes flag of the database)
+                await create_task(self.callback(), name=self.name, context=Context())
+            except Exception as err:  # noqa: BLE001
+                # One failed iteration should not kill the job
+                logger.opt(exception=err).error(f'Periodic task {self.name} failed')
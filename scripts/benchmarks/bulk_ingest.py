@@ -0,0 +1,72 @@
+# Compares cache rebuild throughput of the per-row upserts against the COPY-based bulk ingestion.
+# Writes `bench_` prefixed uris and negative user ids into the configured database, and removes them afterwards.
+#
+# Usage: python scripts/benchmarks/bulk_ingest.py [rows] [batch_size]
+import asyncio
+from sys import argv
+from time import perf_counter
+
+from nowplaying.core.database import db
+from nowplaying.external.udownloader import SongQualityInfo
+from nowplaying.models.cached_file import CachedFileRow
+from nowplaying.util.logger import logger
+
+
+def _int_arg(index: int, default: int) -> int:
+    return int(argv[index]) if len(argv) > index else default
+
+
+ROWS = _int_arg(1, 100_000)
+BATCH_SIZE = _int_arg(2, 5_000)
+# Per-row path is way too slow to run over all the rows
+PER_ROW_SAMPLE = min(ROWS, 2_000)
+USERS = 1_000
+
+QUALITY: SongQualityInfo = {'bit_depth': 16, 'bitrate_kbps': 1411, 'sample_rate_khz': 44, 'highest_available': True}
+
+
+def _rows(prefix: str, count: int) -> list[CachedFileRow]:
+    return [CachedFileRow(f'bench_{prefix}_{i}', f'file_{i}', -(i % USERS) - 1, QUALITY) for i in range(count)]
+
+
+def _report(name: str, rows: int, elapsed_sec: float) -> None:
+    logger.info(f'{name:<10} {rows:>8} rows in {elapsed_sec:.2f}s, {rows / elapsed_sec:>10,.0f} rows/s')
+
+
+async def _per_row() -> None:
+    start = perf_counter()
+    for row in _rows('row', PER_ROW_SAMPLE):
+        await db.store_cached_file(*row)
+        await db.increment_sent_tracks_counts({row.cached_by_user_id or 0: 1})
+    _report('per-row', PER_ROW_SAMPLE, perf_counter() - start)
+
+
+async def _bulk() -> None:
+    rows = _rows('bulk', ROWS)
+
+    start = perf_counter()
+    for offset in range(0, ROWS, BATCH_SIZE):
+        batch = rows[offset : offset + BATCH_SIZE]
+        counts: dict[int, int] = {}
+        for row in batch:
+            counts[row.cached_by_user_id or 0] = counts.get(row.cached_by_user_id or 0, 0) + 1
+        await db.bulk_store_cached_files(batch)
+        await db.bulk_increment_track_stats(counts)
+    _report('bulk', ROWS, perf_counter() - start)
+
+
+async def main() -> None:
+    await db.init()
+    try:
+        await _per_row()
+        await _bulk()
+    finally:
+        pool = await db.get_pool()
+        async with pool.acquire() as conn:
+            await conn.execute("DELETE FROM cached_files WHERE uri LIKE 'bench\\_%'")
+            await conn.execute('DELETE FROM user_track_stats WHERE user_id < 0')
+        await db.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+# Compares cache probe latency of the old JSONB containment lookups against the typed columns.
+# Runs against the configured database, but only touches its own scratch tables.
+#
+# Usage: python scripts/benchmarks/cached_files_probe.py [rows] [probes]
+import asyncio
+from random import randrange
+from statistics import mean, quantiles
+from sys import argv
+from time import perf_counter
+
+from asyncpg import Connection, connect
+
+from nowplaying.core.database import db
+from nowplaying.util.logger import logger
+
+
+def _int_arg(index: int, default: int) -> int:
+    return int(argv[index]) if len(argv) > index else default
+
+
+ROWS = _int_arg(1, 3_000_000)
+PROBES = _int_arg(2, 5_000)
+
+SEED_SQL = """
+INSERT INTO {table} (uri, file_id, quality_info)
+SELECT
+    'spotify_' || (i / 2),
+    md5(i::TEXT),
+    jsonb_build_object(
+        'bit_depth', CASE WHEN i % 2 = 0 THEN 16 END,
+        'bitrate_kbps', CASE WHEN i % 2 = 0 THEN 1411 ELSE 256 END,
+        'sample_rate_khz', 44,
+        'highest_available', i % 2 = 0,
+        'marked_as_highest_available', i % 7 = 0
+    )
+FROM generate_series(0, $1 - 1) AS i
+"""
+
+JSONB_TABLE = """
+CREATE TABLE bench_cached_files_jsonb
+(
+    id SERIAL PRIMARY KEY,
+    uri VARCHAR NOT NULL,
+    file_id VARCHAR NOT NULL,
+    quality_info JSONB NOT NULL,
+    highest_available BOOLEAN
+        GENERATED ALWAYS AS ((quality_info ->> 'highest_available')::BOOLEAN) STORED,
+    UNIQUE (uri, highest_available)
+);
+CREATE INDEX ON bench_cached_files_jsonb (uri);
+CREATE INDEX ON bench_cached_files_jsonb ((quality_info->'highest_available'));
+CREATE INDEX ON bench_cached_files_jsonb ((quality_info->'marked_as_highest_available'));
+"""
+
+TYPED_TABLE = """
+CREATE TABLE bench_cached_files_typed
+(
+    id SERIAL PRIMARY KEY,
+    uri VARCHAR NOT NULL,
+    file_id VARCHAR NOT NULL,
+    quality_info JSONB NOT NULL,
+    highest_available BOOLEAN
+        GENERATED ALWAYS AS ((quality_info ->> 'highest_available')::BOOLEAN) STORED,
+    bit_depth INT
+        GENERATED ALWAYS AS ((quality_info ->> 'bit_depth')::INT) STORED,
+    bitrate_kbps NUMERIC
+        GENERATED ALWAYS AS ((quality_info ->> 'bitrate_kbps')::NUMERIC) STORED,
+    sample_rate_khz NUMERIC
+        GENERATED ALWAYS AS ((quality_info ->> 'sample_rate_khz')::NUMERIC) STORED,
+    marked_as_highest_available BOOLEAN NOT NULL
+        GENERATED ALWAYS AS (COALESCE((quality_info ->> 'marked_as_highest_available')::BOOLEAN, FALSE)) STORED,
+    UNIQUE (uri, highest_available)
+);
+CREATE INDEX ON bench_cached_files_typed (uri);
+CREATE INDEX ON bench_cached_files_typed (uri, highest_available, marked_as_highest_available);
+"""
+
+PROBE_QUERIES: dict[str, tuple[str, str]] = {
+    'get_cached_file': (
+        'SELECT * FROM bench_cached_files_jsonb WHERE uri = $1 AND (quality_info @> $2 OR quality_info @> $3) LIMIT 1',
+        (
+            'SELECT * FROM bench_cached_files_typed WHERE uri = $1 '
+            'AND (highest_available = $2 OR marked_as_highest_available) LIMIT 1'
+        ),
+    ),
+    'get_cached_file_by_quality': (
+        'SELECT * FROM bench_cached_files_jsonb WHERE uri = $1 AND quality_info @> $2 LIMIT 1',
+        (
+            'SELECT * FROM bench_cached_files_typed WHERE uri = $1 '
+            'AND bit_depth IS NOT DISTINCT FROM $2 AND bitrate_kbps = $3 AND sample_rate_khz = $4 LIMIT 1'
+        ),
+    ),
+}
+
+
+def _args(name: str, uri: str, *, typed: bool) -> tuple:
+    if name == 'get_cached_file':
+        return (uri, True) if typed else (uri, '{"highest_available":true}', '{"marked_as_highest_available":true}')
+    return (uri, 16, 1411, 44) if typed else (uri, '{"bit_depth":16,"bitrate_kbps":1411,"sample_rate_khz":44}')
+
+
+async def _probe(conn: Connection, name: str, query: str, *, typed: bool) -> list[float]:
+    statement = await conn.prepare(query)
+    timings: list[float] = []
+    for _ in range(PROBES):
+        args = _args(name, f'spotify_{randrange(ROWS // 2)}', typed=typed)  # noqa: S311
+        start = perf_counter()
+        await statement.fetchrow(*args)
+        timings.append((perf_counter() - start) * 1000)
+    return timings
+
+
+def _report(name: str, layout: str, timings: list[float]) -> None:
+    percentiles = quantiles(timings, n=100)
+    logger.info(
+        f'{name:<28} {layout:<6} mean={mean(timings):.3f}ms p50={percentiles[49]:.3f}ms p95={percentiles[94]:.3f}ms'
+    )
+
+
+async def main() -> None:
+    conn = await connect(**db._connect_kwargs())  # noqa: SLF001
+    try:
+        for table, ddl in (('bench_cached_files_jsonb', JSONB_TABLE), ('bench_cached_files_typed', TYPED_TABLE)):
+            logger.info(f'Seeding {table} with {ROWS} rows')
+            await conn.execute(f'DROP TABLE IF EXISTS {table}')
+            await conn.execute(ddl)
+            await conn.execute(SEED_SQL.format(table=table), ROWS)
+            await conn.execute(f'ANALYZE {table}')
+
+        for name, (jsonb_query, typed_query) in PROBE_QUERIES.items():
+            _report(name, 'jsonb', await _probe(conn, name, jsonb_query, typed=False))
+            _report(name, 'typed', await _probe(conn, name, typed_query, typed=True))
+    finally:
+        await conn.execute('DROP TABLE IF EXISTS bench_cached_files_jsonb, bench_cached_files_typed')
+        await conn.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+# Compares the cost of turning cached_files/user_configs rows into models: the old json-text + model_validate path
+# against the orjson codecs + from_record path. Doesn't need any tables, rows are generated on the fly.
+#
+# Usage: python scripts/benchmarks/row_decoding.py [rows] [rounds]
+import asyncio
+from collections.abc import Callable
+from sys import argv
+from time import perf_counter
+from typing import Any
+
+from asyncpg import Connection, Record, connect
+
+from nowplaying.core.database import db
+from nowplaying.models.cached_file import CachedFile
+from nowplaying.models.user_config import UserConfig
+from nowplaying.util.logger import logger
+
+
+def _int_arg(index: int, default: int) -> int:
+    return int(argv[index]) if len(argv) > index else default
+
+
+ROWS = _int_arg(1, 10_000)
+ROUNDS = _int_arg(2, 20)
+
+CACHED_FILES_SQL = """
+SELECT
+    'spotify_' || i AS uri,
+    md5(i::TEXT) AS file_id,
+    i AS cached_by_user_id,
+    jsonb_build_object(
+        'bit_depth', 16,
+        'bitrate_kbps', 1411,
+        'sample_rate_khz', 44,
+        'highest_available', TRUE
+    ) AS quality_info
+FROM generate_series(1, $1) AS i
+"""
+
+USER_CONFIGS_SQL = """
+SELECT
+    i AS user_id,
+    FALSE AS stats_opt_out,
+    TRUE AS add_platform_url,
+    TRUE AS add_media_button,
+    TRUE AS add_song_link,
+    FALSE AS add_bitrate,
+    FALSE AS add_sample_rate,
+    i % 2 = 0 AS lowercase_mode,
+    TRUE AS download_flac,
+    NULL::BOOLEAN AS fast_download_route
+FROM generate_series(1, $1) AS i
+"""
+
+
+def _validate_user_config(row: Record) -> UserConfig:
+    # The old path, NULLs had to be dropped for the defaults to kick in
+    return UserConfig.model_validate({k: v for k, v in row.items() if v is not None})
+
+
+async def _measure(conn: Connection, query: str, decode: Callable[[Record], Any]) -> float:
+    statement = await conn.prepare(query)
+    elapsed = 0.0
+    for _ in range(ROUNDS):
+        start = perf_counter()
+        for row in await statement.fetch(ROWS):
+            decode(row)
+        elapsed += perf_counter() - start
+    return ROWS * ROUNDS / elapsed
+
+
+async def main() -> None:
+    plain = await connect(**db._connect_kwargs())  # noqa: SLF001
+    codecs = await connect(**db._connect_kwargs())  # noqa: SLF001
+    await db._init_connection(codecs)  # noqa: SLF001
+    try:
+        benchmarks = (
+            ('cached_files', 'validate', plain, CACHED_FILES_SQL, lambda row: CachedFile.model_validate(dict(row))),
+            ('cached_files', 'from_record', codecs, CACHED_FILES_SQL, CachedFile.from_record),
+            ('user_configs', 'validate', plain, USER_CONFIGS_SQL, _validate_user_config),
+            ('user_configs', 'from_record', codecs, USER_CONFIGS_SQL, UserConfig.from_record),
+        )
+        for name, path, conn, query, decode in benchmarks:
+            rows_per_sec = await _measure(conn, query, decode)
+            logger.info(f'{name:<14} {path:<12} {rows_per_sec:>12,.0f} rows/s')
+    finally:
+        await plain.close()
+        await codecs.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+# Compares the old linear quality search of the song covers compression against the binary search, with and without
+#   downscaling.
+# Runs over the images in tests/data, plus their 3000px upscaled copies to mimic the huge covers some platforms serve.
+#
+# Usage: python scripts/benchmarks/thumbnail_compression.py [rounds]
+from collections.abc import Callable
+from io import BytesIO
+from pathlib import Path
+from sys import argv
+from time import perf_counter
+from unittest.mock import MagicMock, patch
+
+from PIL import Image
+
+from nowplaying.bot.thumbnails import THUMBNAIL_MAX_SIZE_KB
+from nowplaying.core.config import config
+from nowplaying.util import compressing
+from nowplaying.util.logger import logger
+
+
+DATA_DIR = Path(__file__).parents[2] / 'tests' / 'data'
+ROUNDS = int(argv[1]) if len(argv) > 1 else 5
+UPSCALED_EDGE = 3000
+
+
+def _linear(img_data: BytesIO, target_size_kb: int, quality_step: int = 5) -> BytesIO:
+    # The old implementation, full resolution and one encode per quality step from the top
+    img: Image.Image = Image.open(img_data)
+    valid_options = img.format == compressing.TGT_FORMAT and img.mode == compressing.TGT_MODE
+    if valid_options and img_data.getbuffer().nbytes / 1024 <= target_size_kb:
+        return img_data
+
+    quality = 100 - quality_step if valid_options else 100
+    if img.mode != compressing.TGT_MODE:
+        img = img.convert(compressing.TGT_MODE)
+
+    while quality > 0:
+        output_buffer = compressing._encode(img, quality)  # noqa: SLF001
+        if output_buffer.getbuffer().nbytes / 1024 <= target_size_kb:
+            return output_buffer
+        quality -= quality_step
+    return img_data
+
+
+def _binary_search(img_data: BytesIO, target_size_kb: int) -> BytesIO:
+    return compressing.compress_to_jpeg(img_data, target_size_kb)
+
+
+def _downscale(img_data: BytesIO, target_size_kb: int) -> BytesIO:
+    return compressing.compress_to_jpeg(img_data, target_size_kb, max_edge=config.THUMBNAIL_MAX_EDGE)
+
+
+def _images() -> list[tuple[str, bytes]]:
+    images: list[tuple[str, bytes]] = []
+    for path in sorted(DATA_DIR.iterdir()):
+        data = path.read_bytes()
+        images.append((path.name, data))
+
+        img = Image.open(BytesIO(data))
+        upscaled = BytesIO()
+        img.resize((UPSCALED_EDGE, UPSCALED_EDGE), Image.Resampling.BICUBIC).save(upscaled, format=img.format)
+        images.append((f'{path.name}@{UPSCALED_EDGE}', upscaled.getvalue()))
+    return images
+
+
+def _measure(compress: Callable[[BytesIO, int], BytesIO], data: bytes, encode: MagicMock) -> tuple[float, float, int]:
+    encode.reset_mock()
+
+    start = perf_counter()
+    for _ in range(ROUNDS):
+        result = compress(BytesIO(data), THUMBNAIL_MAX_SIZE_KB)
+    elapsed_ms = (perf_counter() - start) / ROUNDS * 1000
+    return elapsed_ms, result.getbuffer().nbytes / 1024, encode.call_count // ROUNDS
+
+
+def main() -> None:
+    # Every encode is counted, that's what the quality search is paying for
+    with patch.object(compressing, '_encode', wraps=compressing._encode) as encode:  # noqa: SLF001
+        for name, data in _images():
+            for path, compress in (('linear', _linear), ('binary', _binary_search), ('downscale', _downscale)):
+                elapsed_ms, size_kb, count = _measure(compress, data, encode)
+                logger.info(
+                    f'{name:<14} {path:<10} {count:>3} encodes {elapsed_ms:>9.1f} ms {size_kb:>7.1f} kb '
+                    f'({len(data) / 1024:.0f} kb input)'
+                )
+
+
+if __name__ == '__main__':
+    main()
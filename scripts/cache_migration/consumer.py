@@ -1,9 +1,12 @@
 import asyncio
+from collections import Counter
 
 from nowplaying.core.database import db
 from nowplaying.bot.bot import bot, dp
 from nowplaying.core.config import config
+from nowplaying.models.cached_file import CachedFileRow
 from nowplaying.util.logger import logger
+from nowplaying.util.periodic import PeriodicTask
 from aiogram import types
 from aiogram.filters import Filter, CommandStart
 from os import environ
@@ -11,6 +14,45 @@ from os import environ
 
 config.LOCAL_TELEGRAM_API_BASE_URL = 'http://127.0.0.1:8081'
 PRODUCER_TELEGRAM_ID = int(environ['PRODUCER_TELEGRAM_ID'])
+BATCH_SIZE = int(environ.get('CONSUMER_BATCH_SIZE', '5000'))
+FLUSH_INTERVAL_SEC = 5
+
+pending_files: list[CachedFileRow] = []
+# Tracks counted since the last flush, these are added to whatever is in the database already. So a restarted consumer
+#   picks up right where it stopped, as long as the messages aren't replayed (that's what /start is for)
+pending_counts: Counter[int] = Counter()
+flush_lock = asyncio.Lock()
+
+
+async def flush() -> None:
+    async with flush_lock:
+        if not pending_files and not pending_counts:
+            return
+
+        files = pending_files.copy()
+        counts = pending_counts.copy()
+        pending_files.clear()
+        pending_counts.clear()
+
+        try:
+            await db.bulk_store_cached_files(files)
+        except Exception:
+            # Put them back, next flush will retry
+            pending_files[:0] = files
+            pending_counts.update(counts)
+            raise
+
+        try:
+            await db.bulk_increment_track_stats(dict(counts))
+        except Exception:
+            # Files are stored already, only the counts are retried
+            pending_counts.update(counts)
+            raise
+
+        logger.info(f'Flushed {len(files)} cached files and stats of {len(counts)} users')
+
+
+periodic_flush = PeriodicTask(flush, FLUSH_INTERVAL_SEC, name='consumer_flush')
 
 
 class CachedTrackFilter(Filter):
@@ -34,10 +76,12 @@ async def on_cached_track_recv(message: types.Message) -> None:
         exc_msg = 'implement #q'
         raise ValueError(exc_msg)
 
-    await db.store_cached_file(track_uri, message.audio.file_id, user_id, {})  # type: ignore[typeddict-item]
+    pending_files.append(CachedFileRow(track_uri, message.audio.file_id, user_id, {}))  # type: ignore[typeddict-item]
     if user_id:
-        await db.increment_sent_tracks_count(user_id)
-    logger.info(f'Cached file for {track_uri} ({message.audio.file_name}) received from {user_id}')
+        pending_counts[user_id] += 1
+
+    if len(pending_files) >= BATCH_SIZE:
+        await flush()
 
 
 @dp.message(CommandStart())
@@ -46,14 +90,26 @@ async def on_start(message: types.Message) -> None:
         return
 
     logger.info('Initializing database')
-    pool = await db.get_pool()
-    async with pool.acquire() as conn, conn.transaction():
-        await conn.execute('DELETE FROM user_track_stats')
-        await conn.execute('DELETE FROM cached_files')
+    async with flush_lock:
+        pending_files.clear()
+        pending_counts.clear()
+
+        pool = await db.get_pool()
+        async with pool.acquire() as conn, conn.transaction():
+            await conn.execute('DELETE FROM user_track_stats')
+            await conn.execute('DELETE FROM cached_files')
+
+
+async def start_flushing() -> None:
+    periodic_flush.start()
 
 
 async def main() -> None:
     dp.startup.register(db.init)
+    dp.startup.register(start_flushing)
+    dp.shutdown.register(periodic_flush.stop)
+    dp.shutdown.register(flush)
+    dp.shutdown.register(db.close)
     await bot.delete_webhook(drop_pending_updates=True)
     await dp.start_polling(bot)
 
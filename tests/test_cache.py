@@ -0,0 +1,49 @@
+from time import sleep
+
+from nowplaying.util.cache import LRUCache
+
+
+def test_lru_eviction() -> None:
+    cache: LRUCache[int, str] = LRUCache(max_size=2)
+    cache.put(1, 'a')
+    cache.put(2, 'b')
+
+    # Touch the first one, so that the second one becomes the least recently used
+    assert cache.get(1) == 'a'
+    cache.put(3, 'c')
+
+    assert 1 in cache
+    assert 2 not in cache
+    assert 3 in cache
+
+
+def test_lru_stats() -> None:
+    cache: LRUCache[str, int] = LRUCache(max_size=10)
+    cache.put('a', 1)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.hits == 1
+    assert cache.misses == 1
+    assert cache.hit_rate == 0.5
+
+
+def test_lru_pop() -> None:
+    cache: LRUCache[str, int] = LRUCache(max_size=10)
+    cache.put('a', 1)
+
+    assert cache.pop('a') == 1
+    assert cache.pop('a') is None
+    assert len(cache) == 0
+
+
+def test_lru_ttl() -> None:
+    cache: LRUCache[str, int] = LRUCache(max_size=10, ttl_sec=0.05)
+    cache.put('a', 1)
+    assert cache.get('a') == 1
+
+    sleep(0.1)
+    assert 'a' not in cache
+    assert cache.get('a') is None
+    assert cache.misses == 1
+    assert len(cache) == 0
@@ -2,6 +2,7 @@ from io import BytesIO
 from pathlib import Path
 
 import pytest
+from PIL import Image
 
 from nowplaying.util.compressing import compress_to_jpeg
 
@@ -17,3 +18,17 @@ def test_compression(file_name: str) -> None:
     data = (DATA_DIR / file_name).read_bytes()
     result = compress_to_jpeg(BytesIO(data), target_size_kb=200)
     assert result.getbuffer().nbytes / 1024 <= 200
+
+
+@pytest.mark.parametrize(
+    'file_name',
+    reversed([pytest.param(x.name, id=x.name) for x in DATA_DIR.iterdir()]),
+)
+def test_compression_downscale(file_name: str) -> None:
+    data = (DATA_DIR / file_name).read_bytes()
+    result = compress_to_jpeg(BytesIO(data), target_size_kb=200, max_edge=320)
+    assert result.getbuffer().nbytes / 1024 <= 200
+
+    img = Image.open(result)
+    assert img.format == 'JPEG'
+    assert max(img.size) == 320
@@ -0,0 +1,93 @@
+from asyncio import CancelledError, Event, create_task, sleep
+
+import pytest
+
+from nowplaying.util.counter_buffer import CounterBuffer
+
+
+@pytest.mark.asyncio
+async def test_counter_buffer_aggregates() -> None:
+    flushed: list[dict[int, int]] = []
+
+    async def flush(batch: dict[int, int]) -> None:
+        flushed.append(batch)
+
+    buffer: CounterBuffer[int] = CounterBuffer(flush, flush_interval_sec=60, max_events=100)
+    buffer.increment(1)
+    buffer.increment(1)
+    buffer.increment(2)
+    assert buffer.pending(1) == 2
+
+    await buffer.stop()
+    assert flushed == [{1: 2, 2: 1}]
+    assert buffer.pending(1) == 0
+
+
+@pytest.mark.asyncio
+async def test_counter_buffer_max_events() -> None:
+    flushed: list[dict[str, int]] = []
+
+    async def flush(batch: dict[str, int]) -> None:
+        flushed.append(batch)
+
+    buffer: CounterBuffer[str] = CounterBuffer(flush, flush_interval_sec=60, max_events=2)
+    buffer.increment('a')
+    buffer.increment('b')
+    # Let the scheduled flush run
+    await sleep(0)
+    buffer.increment('c')
+
+    await buffer.stop()
+    assert flushed == [{'a': 1, 'b': 1}, {'c': 1}]
+
+
+@pytest.mark.asyncio
+async def test_counter_buffer_keeps_failed_batch() -> None:
+    async def flush(_: dict[int, int]) -> None:
+        raise ConnectionError
+
+    buffer: CounterBuffer[int] = CounterBuffer(flush, flush_interval_sec=60, max_events=100)
+    buffer.increment(1)
+    await buffer.flush()
+    assert buffer.pending(1) == 1
+
+
+@pytest.mark.asyncio
+async def test_counter_buffer_stop_during_flush() -> None:
+    flushed: list[dict[int, int]] = []
+    flush_started = Event()
+    release_flush = Event()
+
+    async def flush(batch: dict[int, int]) -> None:
+        flush_started.set()
+        await release_flush.wait()
+        flushed.append(batch)
+
+    buffer: CounterBuffer[int] = CounterBuffer(flush, flush_interval_sec=0, max_events=100)
+    buffer.increment(1)
+    await buffer.start()
+    await flush_started.wait()
+
+    # Stopping while the periodic flush is in the middle of writing the batch
+    stop_task = create_task(buffer.stop())
+    await sleep(0)
+    release_flush.set()
+    await stop_task
+
+    assert flushed[0] == {1: 1}
+    assert buffer.pending(1) == 0
+
+
+@pytest.mark.asyncio
+async def test_counter_buffer_keeps_cancelled_batch() -> None:
+    async def flush(_: dict[int, int]) -> None:
+        await Event().wait()
+
+    buffer: CounterBuffer[int] = CounterBuffer(flush, flush_interval_sec=60, max_events=100)
+    buffer.increment(1)
+    task = create_task(buffer.flush())
+    await sleep(0)
+    task.cancel()
+    with pytest.raises(CancelledError):
+        await task
+    assert buffer.pending(1) == 1
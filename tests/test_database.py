@@ -0,0 +1,19 @@
+from decimal import Decimal
+
+import pytest
+
+from nowplaying.core.database import to_numeric
+
+
+@pytest.mark.parametrize(
+    ('value', 'expected'),
+    [
+        (44.1, Decimal('44.1')),
+        (44, Decimal(44)),
+        (1411, Decimal(1411)),
+        (320.5, Decimal('320.5')),
+    ],
+)
+def test_to_numeric(value: float, expected: Decimal) -> None:
+    # Would've been 44.10000000000000142.. with `Decimal(44.1)`, never matching the stored value
+    assert to_numeric(value) == expected
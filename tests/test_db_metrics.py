@@ -0,0 +1,35 @@
+from nowplaying.core.db_metrics import DatabaseMetrics, LatencyStats
+
+
+def test_latency_stats() -> None:
+    stats = LatencyStats()
+    stats.observe(0.001)
+    stats.observe(0.003)
+
+    assert stats.count == 2
+    assert stats.max_sec == 0.003
+    assert round(stats.mean_ms, 3) == 2.0
+
+
+def test_in_use_tracking() -> None:
+    metrics = DatabaseMetrics()
+    with metrics.track_in_use():
+        with metrics.track_in_use():
+            assert metrics.in_use == 2
+        assert metrics.in_use == 1
+
+    assert metrics.in_use == 0
+    assert metrics.peak_in_use == 2
+
+
+def test_reset() -> None:
+    metrics = DatabaseMetrics()
+    with metrics.measure_query('GET_CACHED_FILE'):
+        pass
+
+    assert metrics.queries['GET_CACHED_FILE'].count == 1
+    assert 'GET_CACHED_FILE: 1 calls' in '\n'.join(metrics.report(pool_size=2, pool_max_size=10))
+
+    metrics.reset()
+    assert not metrics.queries
+    assert metrics.peak_in_use == 0
@@ -0,0 +1,17 @@
+from nowplaying.core.migrations import Migration, load_migrations
+
+
+def test_migrations_are_contiguous() -> None:
+    versions = [migration.version for migration in load_migrations()]
+    assert versions == list(range(1, len(versions) + 1))
+
+
+def test_no_transaction_migration() -> None:
+    migration = Migration(
+        version=1,
+        name='test',
+        sql='-- no-transaction\nCREATE INDEX CONCURRENTLY a ON b (c);\nCREATE INDEX CONCURRENTLY d ON e (f);\n',
+    )
+    assert not migration.is_transactional
+    assert len(migration.statements) == 2
+    assert str(migration) == '0001_test'